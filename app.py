@@ -0,0 +1,350 @@
+######################################################################################
+# Random Fact Webex Chatbot - webhook app
+#
+# This program:
+# - Receives Webex "messages created" webhook events on POST /webhook.
+# - Verifies the X-Spark-Signature header against WEBEX_WEBHOOK_SECRET.
+# - Hands each event to a bounded worker pipeline and returns 202 immediately,
+#   so the HTTP response never waits on Webex or the fact API. Rooms are handled
+#   concurrently; replies within a room keep their order.
+# - Optionally falls back to polling the configured rooms (BOT_MODE=polling).
+#   One scheduler serves every room; polls and replies share one Webex call budget.
+# - Serves /health (loop liveness, upstream reachability) and /metrics
+#   (Prometheus: per-stage latency, queue depths, upstream status classes).
+#
+# .env example (same folder as this script):
+#   WEBEX_ACCESS_TOKEN=token-used-to-read-and-post-messages (defaults to WEBEX_BOT_TOKEN)
+#   WEBEX_BOT_EMAIL=myWeather-bot@webex.bot
+#   WEBEX_ROOM_ID=Y2lzY29zcGFyazovL3VybjpURUFNOnVzLXdlc3QtMl9yL1JPT00v... (polling mode)
+#   WEBEX_ROOM_IDS=room-id-1,room-id-2 (polling mode, more rooms)
+#   ROOMS_FILE=rooms.txt (polling mode, one room ID per line, re-read on change)
+#   WEBEX_WEBHOOK_SECRET=secret-given-when-registering-the-webhook
+#   WEBEX_WEBHOOK_ALLOW_UNSIGNED=true (only for webhooks registered without a secret)
+#   BOT_MODE=webhook | polling
+#   WEBEX_API_BASE / FACT_API_URL (optional, to point the bot at other servers)
+#   FACT_CORPUS_PATH=fact_corpus.jsonl (offline fallback facts)
+#   WEBEX_BUDGET_PER_MINUTE=300 (Webex calls per minute, polls and replies combined)
+#   REPLY_COALESCE=true (merge pending fact replies for a room into one message)
+#   STATE_DB_PATH=bot_state.sqlite3 (cursors and processed IDs; empty disables)
+######################################################################################
+
+import hashlib
+import hmac
+import os
+import threading
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from bot import process_message
+from dispatcher import ReplyDispatcher
+from facts import FACT_API_URL, FactBuffer
+from http_client import default_clients
+from metrics import QUEUE_DEPTH, REQUESTS_TOTAL, seconds_since_heartbeat
+from pipeline import Pipeline
+from scheduler import RoomScheduler, calls_per_minute_bucket, watch_rooms_file
+from state_store import StateStore
+from webex_client import WEBEX_API_BASE, WebexClient
+
+######################################################################################
+# Load environment variables
+######################################################################################
+
+load_dotenv()
+
+WEBEX_ACCESS_TOKEN = os.getenv("WEBEX_ACCESS_TOKEN") or os.getenv("WEBEX_BOT_TOKEN")
+WEBEX_API_BASE = os.getenv("WEBEX_API_BASE", WEBEX_API_BASE)
+FACT_API_URL = os.getenv("FACT_API_URL", FACT_API_URL)
+WEBEX_BOT_EMAIL = os.getenv("WEBEX_BOT_EMAIL")
+WEBEX_ROOM_ID = os.getenv("WEBEX_ROOM_ID")
+WEBEX_ROOM_IDS = [
+    r.strip() for r in os.getenv("WEBEX_ROOM_IDS", "").split(",") if r.strip()
+]
+ROOMS_FILE = os.getenv("ROOMS_FILE")
+WEBEX_WEBHOOK_SECRET = os.getenv("WEBEX_WEBHOOK_SECRET", "")
+WEBEX_WEBHOOK_ALLOW_UNSIGNED = os.getenv(
+    "WEBEX_WEBHOOK_ALLOW_UNSIGNED", "false"
+).lower() in ("1", "true", "yes")
+BOT_MODE = os.getenv("BOT_MODE", "webhook").lower()
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+BOT_MAX_PENDING = int(os.getenv("BOT_MAX_PENDING", "1000"))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "1"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "30"))
+POLL_PAGE_SIZE = int(os.getenv("POLL_PAGE_SIZE", "100"))
+# Unset: catch up on any backlog in full; set: skip what lies beyond N pages
+POLL_MAX_PAGES = int(os.getenv("POLL_MAX_PAGES", "0")) or None
+# One budget per access token, spent by polls and reply POSTs alike
+WEBEX_BUDGET_PER_MINUTE = float(
+    os.getenv("WEBEX_BUDGET_PER_MINUTE") or os.getenv("POLL_BUDGET_PER_MINUTE") or "300"
+)
+REPLY_ROOM_RATE = float(os.getenv("REPLY_ROOM_RATE", "2"))
+REPLY_ROOM_BURST = float(os.getenv("REPLY_ROOM_BURST", "5"))
+REPLY_COALESCE = os.getenv("REPLY_COALESCE", "false").lower() in ("1", "true", "yes")
+STATE_DB_PATH = os.getenv(
+    "STATE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot_state.sqlite3"),
+)
+FACT_BUFFER_SIZE = int(os.getenv("FACT_BUFFER_SIZE", "20"))
+FACT_TTL_SECONDS = float(os.getenv("FACT_TTL_SECONDS", "3600"))
+FACT_CORPUS_PATH = os.getenv(
+    "FACT_CORPUS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_corpus.jsonl"),
+)
+
+######################################################################################
+# Background workers
+######################################################################################
+
+app = Flask(__name__)
+
+stop_event = threading.Event()
+fact_buffer = FactBuffer(
+    url=FACT_API_URL,
+    capacity=FACT_BUFFER_SIZE,
+    ttl=FACT_TTL_SECONDS,
+    corpus_path=FACT_CORPUS_PATH,
+)
+
+_client = None
+_dispatcher = None
+_state_store = None
+_started = False
+scheduler = None
+_start_lock = threading.Lock()
+# Webex rate limits are per token: the scheduler and the dispatcher share this,
+# and a 429 on either pauses both
+webex_budget = calls_per_minute_bucket(WEBEX_BUDGET_PER_MINUTE)
+
+
+def get_client():
+    global _client
+    if _client is None and WEBEX_ACCESS_TOKEN:
+        _client = WebexClient(WEBEX_ACCESS_TOKEN, api_base=WEBEX_API_BASE)
+    return _client
+
+
+def get_state_store():
+    global _state_store
+    if _state_store is None and STATE_DB_PATH:
+        _state_store = StateStore(STATE_DB_PATH)
+    return _state_store
+
+
+def get_dispatcher():
+    global _dispatcher
+    client = get_client()
+    if _dispatcher is None and client is not None:
+        _dispatcher = ReplyDispatcher(
+            client,
+            room_rate=REPLY_ROOM_RATE,
+            room_burst=REPLY_ROOM_BURST,
+            coalesce=REPLY_COALESCE,
+            budget=webex_budget,
+        )
+    return _dispatcher
+
+
+def process_event(event):
+    client = get_client()
+    if client is None:
+        print("[ERROR] No Webex access token configured; dropping event.")
+        return
+
+    data = event.get("data", {})
+    if WEBEX_BOT_EMAIL and data.get("personEmail") == WEBEX_BOT_EMAIL:
+        return
+
+    store = get_state_store()
+    if store is not None and store.is_processed(data.get("id")):
+        # Webhook redelivery or a message both polled and pushed
+        return
+
+    message = event.get("message")
+    if message is None:
+        # Webhook payloads only carry the message ID, never the text
+        try:
+            message = client.get_message(data["id"])
+        except Exception as e:
+            print(f"[ERROR] Could not load message {data.get('id')}: {e}")
+            return
+
+    process_message(
+        client,
+        message,
+        store=store,
+        bot_email=WEBEX_BOT_EMAIL,
+        facts=fact_buffer,
+        dispatcher=get_dispatcher(),
+    )
+
+
+pipeline = Pipeline(process_event, workers=BOT_WORKERS, max_pending=BOT_MAX_PENDING)
+
+# Read at scrape time, so queue depths cost nothing on the hot path
+QUEUE_DEPTH.labels(queue="commands").set_function(pipeline.qsize)
+QUEUE_DEPTH.labels(queue="replies").set_function(
+    lambda: _dispatcher.qsize() if _dispatcher else 0
+)
+QUEUE_DEPTH.labels(queue="facts_buffered").set_function(lambda: len(fact_buffer))
+
+
+def _enqueue_message(message):
+    # The poller already has the full message, so process_event skips the GET.
+    # Blocking here when the pipeline is full slows the poller down.
+    pipeline.submit(message.get("roomId"), {"data": message, "message": message})
+
+
+def start_background():
+    """Start the workers (and the poll scheduler in polling mode) once."""
+    global _started, scheduler
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+        fact_buffer.start()
+        pipeline.start()
+        if get_dispatcher() is not None:
+            get_dispatcher().start()
+
+        if BOT_MODE == "polling":
+            client = get_client()
+            room_ids = list(WEBEX_ROOM_IDS)
+            if WEBEX_ROOM_ID and WEBEX_ROOM_ID not in room_ids:
+                room_ids.insert(0, WEBEX_ROOM_ID)
+            if client is None or not (room_ids or ROOMS_FILE):
+                raise RuntimeError(
+                    "Polling mode needs an access token and WEBEX_ROOM_ID, "
+                    "WEBEX_ROOM_IDS or ROOMS_FILE in .env."
+                )
+            scheduler = RoomScheduler(
+                client,
+                _enqueue_message,
+                room_ids=room_ids,
+                budget=webex_budget,
+                min_interval=POLL_MIN_INTERVAL,
+                max_interval=POLL_MAX_INTERVAL,
+                page_size=POLL_PAGE_SIZE,
+                max_pages=POLL_MAX_PAGES,
+                # Resume from the saved cursors and catch up on the backlog
+                store=get_state_store(),
+            )
+            threading.Thread(
+                target=scheduler.run, args=(stop_event,), name="scheduler", daemon=True
+            ).start()
+            if ROOMS_FILE:
+                threading.Thread(
+                    target=watch_rooms_file,
+                    args=(scheduler, ROOMS_FILE, stop_event),
+                    # The file adds to the rooms from .env, never replaces them
+                    kwargs={"static_room_ids": room_ids},
+                    name="rooms-file",
+                    daemon=True,
+                ).start()
+
+
+######################################################################################
+# Webhook signature
+######################################################################################
+
+def signature_valid(body, signature, secret=None, allow_unsigned=None):
+    secret = WEBEX_WEBHOOK_SECRET if secret is None else secret
+    if allow_unsigned is None:
+        allow_unsigned = WEBEX_WEBHOOK_ALLOW_UNSIGNED
+    if not secret:
+        # Without a secret anyone can post events, and the bot would answer
+        # them with its token; only accept that when explicitly asked to
+        return allow_unsigned
+    if not signature:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha1).hexdigest()
+    return hmac.compare_digest(expected, signature.lower())
+
+
+######################################################################################
+# Routes
+######################################################################################
+
+@app.before_request
+def _count_request():
+    REQUESTS_TOTAL.labels(endpoint=request.endpoint or "unknown").inc()
+
+
+@app.post("/webhook")
+def webhook():
+    body = request.get_data()
+    if not signature_valid(body, request.headers.get("X-Spark-Signature")):
+        return jsonify({"ok": False, "error": "invalid signature"}), 403
+
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict):
+        return jsonify({"ok": False, "error": "body must be a JSON object"}), 400
+    if event.get("resource") != "messages" or event.get("event") != "created":
+        return jsonify({"ok": True, "ignored": True}), 200
+    data = event.get("data")
+    if not isinstance(data, dict) or not data.get("id"):
+        return jsonify({"ok": False, "error": "missing message id"}), 400
+
+    start_background()
+    if not pipeline.submit(data.get("roomId"), event, block=False):
+        # Backpressure: shed load instead of queueing without bound
+        return jsonify({"ok": False, "error": "queue full"}), 503
+
+    return jsonify({"ok": True}), 202
+
+
+def loop_alive():
+    """None before start, then whether the workers (and the poller) still run."""
+    if not _started:
+        return None
+    alive = pipeline.alive() and (_dispatcher is None or _dispatcher.alive())
+    if scheduler is not None and scheduler.room_ids:
+        # Some room is due at least every POLL_MAX_INTERVAL; allow for slow polls
+        since = seconds_since_heartbeat("poller")
+        alive = alive and since is not None and since < POLL_MAX_INTERVAL + 60
+    return alive
+
+
+@app.get("/health")
+def health():
+    alive = loop_alive()
+    ok = alive is not False
+    return jsonify({
+        "ok": ok,
+        "mode": BOT_MODE,
+        "loop_alive": alive,
+        "upstreams": default_clients().upstream_status(),
+        "queue_depth": pipeline.qsize(),
+        "replies_pending": _dispatcher.qsize() if _dispatcher else 0,
+        "facts_buffered": len(fact_buffer),
+        "rooms": len(scheduler.room_ids) if scheduler else None,
+        "active_rooms": scheduler.active_rooms() if scheduler else None,
+        "http": default_clients().stats(),
+    }), 200 if ok else 503
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+if __name__ == "__main__":
+    if BOT_MODE == "webhook" and not WEBEX_WEBHOOK_SECRET:
+        if WEBEX_WEBHOOK_ALLOW_UNSIGNED:
+            print("[WARN] WEBEX_WEBHOOK_SECRET is not set; accepting unsigned webhooks.")
+        else:
+            print(
+                "[WARN] WEBEX_WEBHOOK_SECRET is not set; /webhook will reject every "
+                "event (set WEBEX_WEBHOOK_ALLOW_UNSIGNED=true to accept unsigned ones)."
+            )
+    start_background()
+    try:
+        app.run(host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "5000")))
+    finally:
+        stop_event.set()
+        pipeline.shutdown(drain=True, timeout=SHUTDOWN_DRAIN_SECONDS)
+        if _dispatcher is not None:
+            _dispatcher.shutdown(drain=True, timeout=SHUTDOWN_DRAIN_SECONDS)
+        fact_buffer.stop()
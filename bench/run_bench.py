@@ -0,0 +1,391 @@
+######################################################################################
+# Offline end-to-end benchmark
+#
+# Starts the stub Webex and fact servers, runs the real bot against them in a
+# subprocess (random_facts_chatbot.py --non-interactive, or app.py in polling
+# mode), types /fact commands into the stub rooms at a configurable rate and
+# measures what comes back:
+# - command-to-reply latency percentiles and reply throughput;
+# - missed and duplicate replies (replies are matched to commands per room, in
+#   order, which the bot guarantees);
+# - upstream calls by endpoint, including 429s.
+#
+# Results are written as JSON with a fixed schema. Pass --compare with an
+# earlier run to fail (exit code 1) on regressions.
+#
+#   python -m bench.run_bench --rate 300 --duration 30 --out bench_output.json
+#   python -m bench.run_bench --target app --rooms 20 --compare bench_output.json
+######################################################################################
+
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.stub_servers import StubFacts, StubWebex
+from dispatcher import COALESCE_SEPARATOR
+
+######################################################################################
+# Constants
+######################################################################################
+
+SCHEMA_VERSION = 2
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_TOKEN = "bench-token"
+
+# Lower is better for all of these; compared against the baseline with tolerance
+LATENCY_KEYS = ("p50", "p90", "p99")
+# Small absolute slack so a 3ms -> 4ms change on a fast run is not a regression
+LATENCY_SLACK_MS = 50
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+######################################################################################
+# Bot process
+######################################################################################
+
+def _start_bot(target, webex, facts, room_ids, workdir, bot_env, log):
+    env = dict(os.environ)
+    env.update({
+        "WEBEX_ACCESS_TOKEN": BENCH_TOKEN,
+        "WEBEX_BOT_EMAIL": webex.bot_email,
+        "WEBEX_API_BASE": webex.api_base,
+        "FACT_API_URL": facts.url,
+        "STATE_DB_PATH": os.path.join(workdir, "bot_state.sqlite3"),
+        "FACT_CORPUS_PATH": os.path.join(workdir, "fact_corpus.jsonl"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if target == "script":
+        env["WEBEX_ROOM_ID"] = room_ids[0]
+        cmd = [sys.executable, "random_facts_chatbot.py", "--non-interactive"]
+    else:
+        env.update({
+            "BOT_MODE": "polling",
+            "WEBEX_ROOM_ID": "",
+            "WEBEX_ROOM_IDS": ",".join(room_ids),
+            "PORT": str(_free_port()),
+            "HOST": "127.0.0.1",
+        })
+        cmd = [sys.executable, "app.py"]
+    env.update(bot_env)
+    return subprocess.Popen(
+        cmd, cwd=REPO_DIR, env=env, stdin=subprocess.DEVNULL,
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def _stop_bot(proc, timeout=15):
+    if proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+######################################################################################
+# Measuring
+######################################################################################
+
+def _match_replies(webex, commands):
+    """Pair each room's replies with its commands in order.
+
+    Returns (latencies in ms, replies, missed, duplicates).
+    """
+    with webex.lock:
+        sent = list(zip(webex.sent, webex.sent_times))
+
+    replies_by_room = {}
+    for payload, at in sent:
+        # A coalesced reply answers several commands at once. Only the dispatcher
+        # writes COALESCE_SEPARATOR; /facts N joins its facts with another rule.
+        # Coalescing is off unless the run turns it on (--coalesce)
+        parts = payload.get("markdown", "").count(COALESCE_SEPARATOR) + 1
+        replies_by_room.setdefault(payload.get("roomId"), []).extend([at] * parts)
+
+    latencies = []
+    replies = missed = duplicates = 0
+    for room_id in set(commands) | set(replies_by_room):
+        sent_at = commands.get(room_id, [])
+        replied_at = replies_by_room.get(room_id, [])
+        replies += len(replied_at)
+        for command_at, reply_at in zip(sent_at, replied_at):
+            latencies.append((reply_at - command_at) * 1000.0)
+        missed += max(0, len(sent_at) - len(replied_at))
+        duplicates += max(0, len(replied_at) - len(sent_at))
+    return latencies, replies, missed, duplicates
+
+
+def run_benchmark(
+    target="script",
+    rate=120.0,
+    duration=10.0,
+    rooms=1,
+    arrival="poisson",
+    room_choice="random",
+    coalesce=False,
+    webex_latency=0.0,
+    fact_latency=0.0,
+    throttle_probability=0.0,
+    post_limit_per_second=None,
+    fact_failure_rate=0.0,
+    startup_timeout=30.0,
+    drain_timeout=30.0,
+    seed=1,
+    bot_env=None,
+    log_path=None,
+):
+    """Run one benchmark and return the result document (see SCHEMA_VERSION)."""
+    if target == "script" and rooms != 1:
+        raise ValueError("random_facts_chatbot.py serves one room; use --target app")
+    if target == "script" and coalesce:
+        raise ValueError("random_facts_chatbot.py does not coalesce replies; use --target app")
+
+    config = {
+        "target": target, "rate_per_min": rate, "duration_s": duration, "rooms": rooms,
+        "arrival": arrival, "room_choice": room_choice, "coalesce": coalesce,
+        "webex_latency_s": webex_latency, "fact_latency_s": fact_latency,
+        "throttle_probability": throttle_probability,
+        "post_limit_per_second": post_limit_per_second,
+        "fact_failure_rate": fact_failure_rate, "seed": seed, "bot_env": bot_env or {},
+    }
+    rng = random.Random(seed)
+    room_ids = [f"bench-room-{i}" for i in range(rooms)]
+
+    webex = StubWebex().start()
+    facts = StubFacts().start()
+    webex.latency = webex_latency
+    webex.post_limit_per_second = post_limit_per_second
+    facts.latency = fact_latency
+    facts.failure_rate = fact_failure_rate
+    webex.rng.seed(seed)
+    facts.rng.seed(seed + 1)
+    for room_id in room_ids:
+        webex.add_room(room_id, title=f"Bench {room_id}")
+
+    workdir = tempfile.mkdtemp(prefix="webexbot-bench-")
+    log = open(log_path or os.path.join(workdir, "bot.log"), "w")
+    # Coalescing changes what a reply is; only on when the run asks for it
+    env = {"REPLY_COALESCE": "true" if coalesce else "false"}
+    env.update(bot_env or {})
+    proc = _start_bot(target, webex, facts, room_ids, workdir, env, log)
+    commands = {}
+    try:
+        # The bot starts from the newest message; wait until every room is primed
+        deadline = time.monotonic() + startup_timeout
+        while any(webex.list_calls_by_room[r] == 0 for r in room_ids):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"bot did not start; see {log.name}")
+            time.sleep(0.05)
+
+        # Only random 429s once the run starts, so priming is not skewed
+        webex.throttle_probability = throttle_probability
+        start = time.monotonic()
+        next_at = start
+        total = max(1, int(round(rate * duration / 60.0)))
+        for n in range(total):
+            next_at += rng.expovariate(rate / 60.0) if arrival == "poisson" else 60.0 / rate
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            room_id = room_ids[n % rooms] if room_choice == "round-robin" else rng.choice(room_ids)
+            webex.add_message("/fact", room_id=room_id)
+            commands.setdefault(room_id, []).append(time.monotonic())
+        sent_all = time.monotonic()
+
+        deadline = sent_all + drain_timeout
+        while time.monotonic() < deadline:
+            if _match_replies(webex, commands)[1] >= total:
+                break
+            time.sleep(0.05)
+        # A little longer, so late duplicates are still counted
+        time.sleep(0.5)
+    finally:
+        webex.throttle_probability = 0.0
+        _stop_bot(proc)
+        log.close()
+        webex.stop()
+        facts.stop()
+
+    latencies, replies, missed, duplicates = _match_replies(webex, commands)
+    last_reply = max(webex.sent_times) if webex.sent_times else sent_all
+    calls = dict(webex.calls)
+    calls.update(facts.calls)
+    calls["429 responses"] = webex.throttled_responses
+    webex_calls = sum(webex.calls.values())
+    total_commands = sum(len(v) for v in commands.values())
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "revision": _revision(),
+        "config": config,
+        "results": {
+            "commands": total_commands,
+            "replies": replies,
+            "missed": missed,
+            "duplicates": duplicates,
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+            },
+            "throughput_per_s": replies / max(1e-9, last_reply - start),
+            "upstream_calls": calls,
+            "webex_calls_per_command": webex_calls / max(1, total_commands),
+        },
+    }
+
+
+######################################################################################
+# Comparing runs
+######################################################################################
+
+def compare(result, baseline, tolerance=0.2):
+    """Return a list of regressions of result against baseline (empty if none)."""
+    if baseline.get("schema") != result.get("schema"):
+        return [f"schema {baseline.get('schema')} vs {result.get('schema')}; not comparable"]
+    if baseline.get("config") != result.get("config"):
+        return ["configs differ; rerun both revisions with the same options"]
+
+    new, old = result["results"], baseline["results"]
+    regressions = []
+    for key in ("missed", "duplicates"):
+        if new[key] > old[key]:
+            regressions.append(f"{key}: {old[key]} -> {new[key]}")
+    for key in LATENCY_KEYS:
+        a, b = old["latency_ms"][key], new["latency_ms"][key]
+        if a is not None and b is not None and b > a * (1 + tolerance) + LATENCY_SLACK_MS:
+            regressions.append(f"latency {key}: {a:.0f}ms -> {b:.0f}ms")
+    a, b = old["webex_calls_per_command"], new["webex_calls_per_command"]
+    if b > a * (1 + tolerance):
+        regressions.append(f"webex calls per command: {a:.2f} -> {b:.2f}")
+    a, b = old["throughput_per_s"], new["throughput_per_s"]
+    if b < a * (1 - tolerance):
+        regressions.append(f"throughput: {a:.1f}/s -> {b:.1f}/s")
+    return regressions
+
+
+def format_result(result):
+    r = result["results"]
+    lat = r["latency_ms"]
+
+    def ms(value):
+        return "n/a" if value is None else f"{value:.0f}ms"
+
+    lines = [
+        f"revision {result['revision']}  target {result['config']['target']}  "
+        f"{result['config']['rate_per_min']:.0f} cmd/min for {result['config']['duration_s']:.0f}s "
+        f"over {result['config']['rooms']} room(s)",
+        f"  commands {r['commands']}  replies {r['replies']}  "
+        f"missed {r['missed']}  duplicates {r['duplicates']}",
+        f"  latency p50 {ms(lat['p50'])}  p90 {ms(lat['p90'])}  p99 {ms(lat['p99'])}  "
+        f"max {ms(lat['max'])}",
+        f"  throughput {r['throughput_per_s']:.1f} replies/s  "
+        f"webex calls per command {r['webex_calls_per_command']:.2f}",
+    ]
+    for name, count in sorted(r["upstream_calls"].items()):
+        lines.append(f"    {name}: {count}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", choices=("script", "app"), default="script")
+    parser.add_argument("--rate", type=float, default=120.0, help="commands per minute")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--rooms", type=int, default=1)
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson",
+                        help="spacing between commands")
+    parser.add_argument("--room-choice", choices=("random", "round-robin"), default="random",
+                        help="which room each command goes to")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="let the bot merge pending replies (app target only)")
+    parser.add_argument("--webex-latency", type=float, default=0.0, help="seconds per call")
+    parser.add_argument("--fact-latency", type=float, default=0.0, help="seconds per call")
+    parser.add_argument("--throttle-probability", type=float, default=0.0,
+                        help="share of Webex calls answered with 429")
+    parser.add_argument("--post-limit", type=int, default=None,
+                        help="POST /messages allowed per second before 429")
+    parser.add_argument("--fact-failure-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bot-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the bot, e.g. POLL_MIN_INTERVAL=0.2")
+    parser.add_argument("--log", help="where to write the bot's output")
+    parser.add_argument("--out", help="write the JSON result here")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        target=args.target,
+        rate=args.rate,
+        duration=args.duration,
+        rooms=args.rooms,
+        arrival=args.arrival,
+        room_choice=args.room_choice,
+        coalesce=args.coalesce,
+        webex_latency=args.webex_latency,
+        fact_latency=args.fact_latency,
+        throttle_probability=args.throttle_probability,
+        post_limit_per_second=args.post_limit,
+        fact_failure_rate=args.fact_failure_rate,
+        drain_timeout=args.drain_timeout,
+        seed=args.seed,
+        bot_env=dict(kv.split("=", 1) for kv in args.bot_env),
+        log_path=args.log,
+    )
+    print(format_result(result))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {baseline.get('revision')}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions against {baseline.get('revision')}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+######################################################################################
+# Local stand-ins for the Webex API and the random facts API
+#
+# Used by the tests and by bench/run_bench.py, so the bot can be exercised and
+# measured without Webex credentials or internet access.
+#
+# StubWebex emulates the parts of https://webexapis.com/v1 the bot uses:
+#   GET  /v1/rooms, GET /v1/rooms/{id}
+#   GET  /v1/messages (roomId, max, beforeMessage; newest first), GET /v1/messages/{id}
+#   POST /v1/messages (replies are recorded and also appear in the room)
+# with optional injected latency, forced or random 429s and a POST rate limit.
+#
+# StubFacts emulates GET /api/v2/facts/random with optional latency and failures.
+######################################################################################
+
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class _StubServer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.latency = 0.0
+        self.rng = random.Random()  # seed it for repeatable 429s and failures
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, url, payload):
+        """Return (status, body, headers). Overridden by each stub."""
+        raise NotImplementedError
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                payload = None
+                length = int(self.headers.get("Content-Length", "0"))
+                if length:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, body, headers = stub.handle(method, urlparse(self.path), payload)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+        return Handler
+
+
+def _route(path):
+    """/v1/messages/m12 -> /v1/messages/{id}, so call counts group by endpoint."""
+    for prefix in ("/v1/messages/", "/v1/rooms/"):
+        if path.startswith(prefix):
+            return prefix + "{id}"
+    return path
+
+
+class StubWebex(_StubServer):
+    def __init__(self, bot_email="bench-bot@webex.bot"):
+        super().__init__()
+        self.bot_email = bot_email
+        self.rooms = {}  # room_id -> title
+        self.messages = {}  # room_id -> list of messages, oldest first
+        self.by_id = {}
+        self.sent = []  # POST payloads, in arrival order
+        self.sent_times = []  # monotonic arrival time of each POST
+        self.list_calls = 0
+        self.list_calls_by_room = Counter()
+        # Forced 429s for the next N requests, or a random share of them
+        self.throttle_next = 0
+        self.throttle_probability = 0.0
+        self.retry_after = 0.1
+        # Sliding one-second window on POST /messages, like Webex's limits
+        self.post_limit_per_second = None
+        self.post_times = deque()
+        self.post_429s = 0
+        self.throttled_responses = 0
+        self._n = 0
+
+    @property
+    def api_base(self):
+        return f"{self.base_url}/v1"
+
+    def add_room(self, room_id, title=None):
+        with self.lock:
+            self.rooms.setdefault(room_id, title or room_id)
+            self.messages.setdefault(room_id, [])
+
+    def add_message(self, text, room_id="room-1", person_email="user@example.com"):
+        with self.lock:
+            return self._add_message(text, room_id, person_email)
+
+    def _add_message(self, text, room_id, person_email):
+        self.rooms.setdefault(room_id, room_id)
+        n = self._n
+        self._n += 1
+        # Several messages share each millisecond, like a busy room
+        created = (EPOCH + timedelta(milliseconds=n // 3)).isoformat(
+            timespec="milliseconds"
+        ).replace("+00:00", "Z")
+        message = {
+            "id": f"m{n}",
+            "roomId": room_id,
+            "text": text,
+            "personEmail": person_email,
+            "created": created,
+        }
+        self.messages.setdefault(room_id, []).append(message)
+        self.by_id[message["id"]] = message
+        return message
+
+    def _throttled(self):
+        if self.throttle_next > 0:
+            self.throttle_next -= 1
+            return True
+        return self.throttle_probability > 0 and self.rng.random() < self.throttle_probability
+
+    def _too_many(self):
+        self.throttled_responses += 1
+        return 429, {"message": "slow down"}, {"Retry-After": str(self.retry_after)}
+
+    def handle(self, method, url, payload):
+        path = url.path
+        with self.lock:
+            self.calls[f"{method} {_route(path)}"] += 1
+            if self._throttled():
+                return self._too_many()
+
+            if method == "GET" and path == "/v1/messages":
+                self.list_calls += 1
+                return 200, {"items": self._list(parse_qs(url.query))}, None
+            if method == "GET" and path.startswith("/v1/messages/"):
+                message = self.by_id.get(path.rsplit("/", 1)[1])
+                return (200, message, None) if message else (404, {"message": "not found"}, None)
+            if method == "GET" and path == "/v1/rooms":
+                items = [{"id": r, "title": t} for r, t in self.rooms.items()]
+                return 200, {"items": items}, None
+            if method == "GET" and path.startswith("/v1/rooms/"):
+                room_id = path.rsplit("/", 1)[1]
+                if room_id not in self.rooms:
+                    return 404, {"message": "not found"}, None
+                return 200, {"id": room_id, "title": self.rooms[room_id]}, None
+            if method == "POST" and path == "/v1/messages":
+                return self._post(payload or {})
+        return 404, {"message": "not found"}, None
+
+    def _list(self, query):
+        room_id = query.get("roomId", [""])[0]
+        max_items = int(query.get("max", ["50"])[0])
+        before_message = query.get("beforeMessage", [None])[0]
+        self.list_calls_by_room[room_id] += 1
+        items = self.messages.get(room_id, [])[::-1]
+        if before_message:
+            ids = [m["id"] for m in items]
+            items = items[ids.index(before_message) + 1:] if before_message in ids else []
+        return items[:max_items]
+
+    def _post(self, payload):
+        limit = self.post_limit_per_second
+        if limit is not None:
+            now = time.monotonic()
+            while self.post_times and self.post_times[0] <= now - 1.0:
+                self.post_times.popleft()
+            if len(self.post_times) >= limit:
+                self.post_429s += 1
+                return self._too_many()
+            self.post_times.append(now)
+        self.sent.append(payload)
+        self.sent_times.append(time.monotonic())
+        # The bot's own replies show up in the room, as they do on Webex
+        message = self._add_message(
+            payload.get("markdown", ""), payload.get("roomId"), self.bot_email
+        )
+        return 200, message, None
+
+
+class StubFacts(_StubServer):
+    def __init__(self):
+        super().__init__()
+        self.failure_rate = 0.0
+        self._n = 0
+
+    @property
+    def url(self):
+        return f"{self.base_url}/api/v2/facts/random"
+
+    def handle(self, method, url, payload):
+        with self.lock:
+            self.calls[f"{method} {url.path}"] += 1
+            if method != "GET" or url.path != "/api/v2/facts/random":
+                return 404, {"message": "not found"}, None
+            if self.failure_rate and self.rng.random() < self.failure_rate:
+                return 500, {"message": "fact API is having a bad day"}, None
+            self._n += 1
+            return 200, {
+                "id": f"fact-{self._n}",
+                "text": f"Stub fact number {self._n}.",
+                "source": "stub",
+                "source_url": "",
+                "language": "en",
+            }, None
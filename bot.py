@@ -0,0 +1,115 @@
+######################################################################################
+# Command handling shared by the webhook app and the poller
+######################################################################################
+
+from commands import CommandContext, router as default_router
+from facts import FACT_API_URL
+from state_store import DEFAULT_ROOM_MAX_AGE
+from webex_client import WebexApiError
+
+
+def handle_message(
+    client,
+    message,
+    bot_email=None,
+    fact_url=FACT_API_URL,
+    facts=None,
+    router=None,
+    dispatcher=None,
+    on_sent=None,
+):
+    """Reply to a single Webex message. Returns True when a reply was sent.
+
+    With a dispatcher the reply is queued for rate-limited delivery instead,
+    and on_sent() runs once the dispatcher is done with it.
+    """
+    router = router or default_router
+    message_text = (message.get("text") or "").strip()
+    room_id = message.get("roomId")
+
+    # Never answer ourselves
+    if bot_email and message.get("personEmail") == bot_email:
+        return False
+
+    print(f"Received: {message_text}")
+
+    # Only act on known commands
+    ctx = CommandContext(room_id, message, facts=facts, fact_url=fact_url)
+    reply_markdown = router.dispatch(ctx, message_text)
+    if reply_markdown is None:
+        return False
+
+    if dispatcher is not None:
+        dispatcher.send(
+            room_id,
+            reply_markdown,
+            coalescible=router.is_coalescible(message_text),
+            on_done=on_sent,
+        )
+        return True
+
+    try:
+        client.post_message(room_id, reply_markdown)
+    except WebexApiError as e:
+        print(
+            f"[ERROR] Failed to send message. "
+            f"Status {e.status_code}: {e.text}"
+        )
+        return False
+    except Exception as e:
+        print(f"[ERROR] Failed to send message to Webex: {e}")
+        return False
+
+    print("✔️ Fact sent!\n")
+    return True
+
+
+def process_message(client, message, store=None, **kwargs):
+    """Handle a message once and record progress in the state store.
+
+    Messages reach this in per-room order, so once one is handled the room's
+    cursor can move to it; after a restart polling resumes from there. A reply
+    queued in a dispatcher only counts as handled once it was delivered (or
+    failed for good), so replies lost in a crash or a timed-out shutdown are
+    sent again after the restart.
+    """
+    message_id = message.get("id")
+    room_id = message.get("roomId")
+
+    if store is None or not message_id:
+        return handle_message(client, message, **kwargs)
+    if store.is_processed(message_id):
+        return False
+
+    def record():
+        store.mark_processed(message_id, room_id)
+        if room_id:
+            store.set_cursor(room_id, message_id, message.get("created", ""))
+
+    dispatcher = kwargs.get("dispatcher")
+    if dispatcher is None:
+        replied = handle_message(client, message, **kwargs)
+        record()
+        return replied
+
+    replied = handle_message(client, message, on_sent=record, **kwargs)
+    if not replied:
+        if dispatcher.pending(room_id):
+            # Earlier replies here are still queued; their callbacks move the cursor
+            store.mark_processed(message_id, room_id)
+        else:
+            record()
+    return replied
+
+
+def lookup_room_title(client, room_id, store=None, max_age=DEFAULT_ROOM_MAX_AGE):
+    """Room title from the state store if fresh enough, otherwise from Webex."""
+    if store is not None:
+        cached = store.get_room(room_id, max_age=max_age)
+        if cached is not None:
+            return cached["title"]
+
+    title = client.get_room_title(room_id)
+    if store is not None:
+        store.put_room(room_id, title)
+    return title
@@ -0,0 +1,90 @@
+######################################################################################
+# Chat command router
+#
+# Maps the first word of a message ("/fact", "/facts", ...) to a handler that
+# returns the markdown reply. New commands only need a @router.command(...) entry.
+######################################################################################
+
+from facts import FACT_API_URL, fact_reply_markdown
+
+######################################################################################
+# Constants
+######################################################################################
+
+MAX_FACTS_PER_COMMAND = 5
+FACT_SEPARATOR = "\n\n---\n\n"
+
+
+class CommandContext:
+    def __init__(self, room_id, message, facts=None, fact_url=FACT_API_URL):
+        self.room_id = room_id
+        self.message = message
+        self.facts = facts
+        self.fact_url = fact_url
+
+    def fact_markdown(self):
+        if self.facts is not None:
+            # Prefetched: no fact API round trip on the reply path
+            return self.facts.reply_markdown(self.room_id)
+        return fact_reply_markdown(self.fact_url)
+
+
+class CommandRouter:
+    def __init__(self):
+        self._commands = {}
+        self._coalescible = set()
+
+    def command(self, name, coalescible=False):
+        """Register a handler. Coalescible replies may be merged when sent."""
+        def register(handler):
+            self._commands[name.lower()] = handler
+            if coalescible:
+                self._coalescible.add(handler)
+            return handler
+        return register
+
+    @property
+    def names(self):
+        return sorted(self._commands)
+
+    def parse(self, text):
+        """Return (handler, args) for a known command, otherwise None."""
+        parts = (text or "").strip().split()
+        if not parts:
+            return None
+        handler = self._commands.get(parts[0].lower())
+        if handler is None:
+            return None
+        return handler, parts[1:]
+
+    def dispatch(self, ctx, text):
+        """Run the matching command and return its markdown reply, or None."""
+        parsed = self.parse(text)
+        if parsed is None:
+            return None
+        handler, args = parsed
+        return handler(ctx, args)
+
+    def is_coalescible(self, text):
+        parsed = self.parse(text)
+        return parsed is not None and parsed[0] in self._coalescible
+
+
+router = CommandRouter()
+
+
+@router.command("/fact", coalescible=True)
+def fact_command(ctx, args):
+    return ctx.fact_markdown()
+
+
+@router.command("/facts", coalescible=True)
+def facts_command(ctx, args):
+    count = 1
+    if args:
+        try:
+            count = int(args[0])
+        except ValueError:
+            count = 1
+    count = max(1, min(MAX_FACTS_PER_COMMAND, count))
+    return FACT_SEPARATOR.join(ctx.fact_markdown() for _ in range(count))
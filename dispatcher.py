@@ -0,0 +1,252 @@
+######################################################################################
+# Outbound reply dispatcher
+#
+# Replies are queued per room and sent by a small pool of threads instead of
+# being POSTed inline. Sends are paced by two token buckets, one per room and
+# one for the access token as a whole, so bursts of commands are spread out
+# rather than running into Webex's rate limits. The token bucket can be shared
+# with the RoomScheduler so polls and replies spend one budget. A 429 pauses
+# every room for Retry-After; other failures are retried with jittered
+# exponential backoff. Replies in a room are sent one at a time, in order.
+#
+# With coalescing on, several pending replies for the same room are merged into
+# one markdown message, which costs one POST instead of several.
+######################################################################################
+
+import random
+import time
+from collections import Counter, deque
+
+from pipeline import WorkerPool
+from ratelimit import TokenBucket
+from webex_client import WebexApiError
+
+######################################################################################
+# Constants
+######################################################################################
+
+# A rule like commands.FACT_SEPARATOR, but written differently so a merged
+# message can still be split back into the replies it holds. bench/run_bench.py
+# counts answered commands this way, so keep it distinct from FACT_SEPARATOR.
+COALESCE_SEPARATOR = "\n\n* * *\n\n"
+# Webex rejects messages over 7439 bytes; stay well clear of it when merging
+MAX_COALESCED_CHARS = 6000
+# How often idle rooms' rate buckets are dropped
+ROOM_BUCKET_PRUNE_INTERVAL = 60.0
+
+
+class Reply:
+    def __init__(self, room_id, markdown, coalescible=False, on_done=None):
+        self.room_id = room_id
+        self.markdown = markdown
+        self.coalescible = coalescible
+        # Called once the reply was sent or given up on, never if it is lost
+        self.on_done = [on_done] if on_done is not None else []
+        self.parts = 1
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class ReplyDispatcher(WorkerPool):
+    def __init__(
+        self,
+        client,
+        room_rate=2.0,
+        room_burst=5,
+        token_rate=5.0,
+        token_burst=10,
+        max_attempts=5,
+        base_backoff=0.5,
+        max_backoff=30.0,
+        coalesce=False,
+        max_coalesce=5,
+        workers=4,
+        budget=None,
+    ):
+        super().__init__(workers, "dispatcher")
+        self.client = client
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        # Calls per access token; pass the scheduler's budget to share it
+        self.token_bucket = budget or TokenBucket(token_rate, capacity=token_burst)
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self.max_coalesce = max_coalesce
+        self.stats = Counter()
+
+        self._queues = {}  # room_id -> deque of Reply
+        self._room_buckets = {}
+        self._not_before = {}  # room_id -> monotonic time
+        self._inflight = set()
+        self._next_prune = time.monotonic() + ROOM_BUCKET_PRUNE_INTERVAL
+
+    def send(self, room_id, markdown, coalescible=False, on_done=None):
+        """Queue a reply for delivery. Returns immediately.
+
+        on_done() runs after the reply was sent or failed for good; a reply still
+        queued at shutdown (or in a crash) never calls it.
+        """
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("reply dispatcher is shutting down")
+            self._queues.setdefault(room_id, deque()).append(
+                Reply(room_id, markdown, coalescible, on_done)
+            )
+            if room_id not in self._room_buckets:
+                self._prune_room_buckets()
+                self._room_buckets[room_id] = TokenBucket(
+                    self.room_rate, capacity=self.room_burst
+                )
+            self._count += 1
+            self._cond.notify_all()
+
+    def pending(self, room_id):
+        """Replies for a room that are queued or being sent."""
+        with self._cond:
+            return len(self._queues.get(room_id, ())) + (room_id in self._inflight)
+
+    def _prune_room_buckets(self):
+        """Drop buckets of idle rooms that have refilled; a new one is the same."""
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + ROOM_BUCKET_PRUNE_INTERVAL
+        for room_id, bucket in list(self._room_buckets.items()):
+            if (
+                room_id not in self._queues
+                and room_id not in self._inflight
+                and bucket.tokens >= bucket.capacity
+            ):
+                del self._room_buckets[room_id]
+
+    ##################################################################################
+    # Picking the next reply
+    ##################################################################################
+
+    def _take_batch(self, room_id):
+        queue = self._queues[room_id]
+        reply = queue.popleft()
+        if not (self.coalesce and reply.coalescible):
+            return reply
+        while (
+            queue
+            and reply.parts < self.max_coalesce
+            and queue[0].coalescible
+            and len(reply.markdown) + len(queue[0].markdown) < MAX_COALESCED_CHARS
+        ):
+            nxt = queue.popleft()
+            reply.markdown += COALESCE_SEPARATOR + nxt.markdown
+            reply.parts += nxt.parts
+            reply.on_done.extend(nxt.on_done)
+        return reply
+
+    def _next(self):
+        """Wait for a room that may send now; returns a Reply or None to stop."""
+        with self._cond:
+            while True:
+                if self._stopping or (self._closing and not self._count and not self._inflight):
+                    return None
+
+                now = time.monotonic()
+                wait = 0.5
+                # Includes any pause after a 429, from a reply or a poll
+                token_wait = self.token_bucket.wait_time()
+                best = None
+                for room_id, queue in self._queues.items():
+                    if not queue or room_id in self._inflight:
+                        continue
+                    room_wait = max(
+                        self._not_before.get(room_id, 0.0) - now,
+                        self._room_buckets[room_id].wait_time(),
+                    )
+                    if room_wait > 0:
+                        wait = min(wait, room_wait)
+                        continue
+                    # Oldest waiting reply first keeps rooms fair
+                    if best is None or queue[0].queued_at < self._queues[best][0].queued_at:
+                        best = room_id
+                if best is not None:
+                    if token_wait <= 0 and self.token_bucket.try_acquire():
+                        self._room_buckets[best].try_acquire()
+                        self._inflight.add(best)
+                        return self._take_batch(best)
+                    wait = min(wait, max(token_wait, 0.001))
+
+                self._cond.wait(wait)
+
+    ##################################################################################
+    # Sending
+    ##################################################################################
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    def _deliver(self, reply):
+        reply.attempts += 1
+        try:
+            self.client.post_message(reply.room_id, reply.markdown)
+            return None
+        except Exception as e:
+            return e
+
+    def _is_final(self, reply, error):
+        """Whether the reply is done with: sent, or failed beyond retrying."""
+        if error is None:
+            return True
+        if isinstance(error, WebexApiError) and error.status_code == 429:
+            return False
+        # 4xx other than 429 will not get better by retrying
+        return (
+            (isinstance(error, WebexApiError) and error.status_code < 500)
+            or reply.attempts >= self.max_attempts
+        )
+
+    def _finish(self, reply, error):
+        final = self._is_final(reply, error)
+        if final:
+            # Before the reply stops counting as pending, so join() (and a
+            # draining shutdown) also waits for what the callbacks record
+            for callback in reply.on_done:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"[ERROR] Reply callback for {reply.room_id} failed: {e}")
+
+        now = time.monotonic()
+        with self._cond:
+            self._inflight.discard(reply.room_id)
+
+            if error is None:
+                self.stats["sent"] += 1
+                self.stats["replies_sent"] += reply.parts
+                if reply.parts > 1:
+                    self.stats["coalesced"] += reply.parts - 1
+                self._count -= reply.parts
+            elif final:
+                print(f"[ERROR] Failed to send message to {reply.room_id}: {error}")
+                self.stats["failed"] += reply.parts
+                self._count -= reply.parts
+            elif isinstance(error, WebexApiError) and error.status_code == 429:
+                # Rate limits are per token: hold every room, not just this one
+                self.token_bucket.pause(error.retry_after or self._backoff(reply.attempts))
+                self.stats["throttled"] += 1
+            else:
+                self._not_before[reply.room_id] = now + self._backoff(reply.attempts)
+                self.stats["retried"] += 1
+
+            if not final:
+                self._queues[reply.room_id].appendleft(reply)
+            elif not self._queues.get(reply.room_id):
+                self._queues.pop(reply.room_id, None)
+                self._not_before.pop(reply.room_id, None)
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            reply = self._next()
+            if reply is None:
+                return
+            self._finish(reply, self._deliver(reply))
@@ -0,0 +1,311 @@
+######################################################################################
+# Random fact source
+#
+# Calls the uselessfacts API at https://uselessfacts.jsph.pl/api/v2/facts/random
+# and renders the result as the markdown reply the bot posts to Webex.
+######################################################################################
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from http_client import default_clients
+from metrics import FACT_FETCH_SECONDS, RENDER_SECONDS
+
+######################################################################################
+# Constants
+######################################################################################
+
+FACT_API_URL = "https://uselessfacts.jsph.pl/api/v2/facts/random"
+
+FACT_UNAVAILABLE_MARKDOWN = (
+    "⚠️ Sorry! I couldn't retrieve a fact right now. "
+    "Please try again later."
+)
+
+
+def fetch_fact(url=FACT_API_URL, http=None):
+    with FACT_FETCH_SECONDS.time():
+        resp = (http or default_clients()).get(url)
+
+    if resp.status_code != 200:
+        raise Exception(f"Fact API returned {resp.status_code}: {resp.text}")
+
+    return resp.json()
+
+
+@RENDER_SECONDS.time()
+def render_fact(fact_json):
+    fact_text = fact_json.get("text", "No fact text found.")
+    source = fact_json.get("source", "unknown")
+    source_url = fact_json.get("source_url", "")
+
+    if source_url:
+        return (
+            f"🧠 **Random Useless Fact**\n\n"
+            f"{fact_text}\n\n"
+            f"_Source: [{source}]({source_url})_"
+        )
+    return f"🧠 **Random Useless Fact**\n\n{fact_text}"
+
+
+def fact_reply_markdown(url=FACT_API_URL, http=None):
+    try:
+        return render_fact(fetch_fact(url, http=http))
+    except Exception as e:
+        print(f"[ERROR] Fact API error: {e}")
+        return FACT_UNAVAILABLE_MARKDOWN
+
+
+######################################################################################
+# Prefetched fact buffer
+#
+# A background thread keeps a small ring buffer of facts topped up so /fact can be
+# answered without waiting on the fact API. Every fetched fact is also appended
+# to an on-disk corpus (JSON lines) that is served when the API is down.
+######################################################################################
+
+def fact_id(fact_json):
+    return fact_json.get("id") or hashlib.sha1(
+        fact_json.get("text", "").encode("utf-8")
+    ).hexdigest()
+
+
+class FactBuffer:
+    def __init__(
+        self,
+        url=FACT_API_URL,
+        http=None,
+        capacity=20,
+        ttl=3600,
+        recent_limit=5000,
+        corpus_path=None,
+        corpus_limit=500,
+        refill_interval=60,
+    ):
+        self.url = url
+        self.http = http
+        self.capacity = capacity
+        self.ttl = ttl
+        self.recent_limit = recent_limit
+        self.corpus_path = corpus_path
+        self.corpus_limit = corpus_limit
+        self.refill_interval = refill_interval
+
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=capacity)  # (fetched_at, fact_json)
+        self._recent = OrderedDict()  # (room_id, fact_id) -> None, oldest first
+        self._corpus = OrderedDict()  # fact_id -> fact_json, oldest first
+        self._corpus_lines = 0
+        # Set when the last fetch (background or inline) failed, cleared by a
+        # success; while set, replies never wait on the fact API
+        self._upstream_failing = False
+        self._wanted = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._load_corpus()
+
+    ##################################################################################
+    # Corpus
+    ##################################################################################
+
+    def _load_corpus(self):
+        if not self.corpus_path or not os.path.exists(self.corpus_path):
+            return
+        try:
+            with open(self.corpus_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    self._corpus_lines += 1
+                    try:
+                        fact = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._corpus[fact_id(fact)] = fact
+        except OSError as e:
+            print(f"[WARN] Could not read fact corpus {self.corpus_path}: {e}")
+        while len(self._corpus) > self.corpus_limit:
+            self._corpus.popitem(last=False)
+
+    def _add_to_corpus(self, fact):
+        key = fact_id(fact)
+        if key in self._corpus:
+            return
+        self._corpus[key] = fact
+        while len(self._corpus) > self.corpus_limit:
+            self._corpus.popitem(last=False)
+        if not self.corpus_path:
+            return
+        try:
+            if self._corpus_lines >= 2 * self.corpus_limit:
+                # Compact: rewrite only what is still kept in memory
+                tmp_path = self.corpus_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for item in self._corpus.values():
+                        f.write(json.dumps(item) + "\n")
+                os.replace(tmp_path, self.corpus_path)
+                self._corpus_lines = len(self._corpus)
+            else:
+                with open(self.corpus_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(fact) + "\n")
+                self._corpus_lines += 1
+        except OSError as e:
+            print(f"[WARN] Could not write fact corpus {self.corpus_path}: {e}")
+
+    ##################################################################################
+    # Buffer
+    ##################################################################################
+
+    def _seen(self, room_id, key):
+        return (room_id, key) in self._recent
+
+    def _least_recently_served(self, room_id):
+        """The corpus fact this room saw longest ago, or None if the corpus is empty."""
+        for seen_room, key in self._recent:
+            if seen_room == room_id and key in self._corpus:
+                return self._corpus[key]
+        return next(iter(self._corpus.values()), None)
+
+    def _mark_served(self, room_id, key):
+        self._recent[(room_id, key)] = None
+        self._recent.move_to_end((room_id, key))
+        while len(self._recent) > self.recent_limit:
+            self._recent.popitem(last=False)
+
+    def add(self, fact):
+        with self._lock:
+            key = fact_id(fact)
+            if all(fact_id(f) != key for _, f in self._buffer):
+                self._buffer.append((time.monotonic(), fact))
+            self._add_to_corpus(fact)
+
+    def _prune_expired(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            while self._buffer and self._buffer[0][0] < cutoff:
+                self._buffer.popleft()
+
+    def refill_once(self):
+        """Fetch facts until the buffer is full. Returns how many were added."""
+        self._prune_expired()
+        added = 0
+        while len(self) < self.capacity and not self._stop.is_set():
+            try:
+                fact = fetch_fact(self.url, http=self.http)
+            except Exception as e:
+                print(f"[WARN] Could not prefetch a fact: {e}")
+                self._upstream_failing = True
+                break
+            self._upstream_failing = False
+            before = len(self)
+            self.add(fact)
+            if len(self) == before:
+                # The API keeps handing us facts we already hold
+                break
+            added += 1
+        return added
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def take(self, room_id=None):
+        """Pop a fresh fact this room has not seen recently, or None.
+
+        During an outage a room that has seen every corpus fact gets repeats,
+        least recently served first, without calling the fact API.
+        """
+        now = time.monotonic()
+        fact = None
+        with self._lock:
+            skipped = []
+            while self._buffer:
+                fetched_at, candidate = self._buffer.popleft()
+                if now - fetched_at > self.ttl:
+                    continue
+                if self._seen(room_id, fact_id(candidate)):
+                    skipped.append((fetched_at, candidate))
+                    continue
+                fact = candidate
+                break
+            # Facts already seen here may still be new to another room
+            self._buffer.extendleft(reversed(skipped))
+
+            if fact is None:
+                for key, candidate in reversed(self._corpus.items()):
+                    if not self._seen(room_id, key):
+                        fact = candidate
+                        break
+
+            if fact is None and self._upstream_failing:
+                # Outage and this room has seen the whole corpus: a repeat
+                # beats no answer, and beats waiting on a dead API
+                fact = self._least_recently_served(room_id)
+
+            if fact is not None:
+                self._mark_served(room_id, fact_id(fact))
+
+        self._wanted.set()
+
+        if fact is None and not self._upstream_failing:
+            # Buffer drained with nothing new on disk: fetch inline once
+            try:
+                fact = fetch_fact(self.url, http=self.http)
+            except Exception as e:
+                print(f"[ERROR] Fact API error: {e}")
+                self._upstream_failing = True
+                fact = None
+            else:
+                self._upstream_failing = False
+            with self._lock:
+                if fact is None:
+                    fact = self._least_recently_served(room_id)
+                else:
+                    self._add_to_corpus(fact)
+                if fact is not None:
+                    self._mark_served(room_id, fact_id(fact))
+        return fact
+
+    def reply_markdown(self, room_id=None):
+        fact = self.take(room_id)
+        if fact is None:
+            return FACT_UNAVAILABLE_MARKDOWN
+        return render_fact(fact)
+
+    ##################################################################################
+    # Background refill
+    ##################################################################################
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            self._prune_expired()
+            if len(self) < self.capacity:
+                if self.refill_once():
+                    backoff = 1.0
+                elif len(self) < self.capacity:
+                    # Upstream is failing; try again later rather than hammer it
+                    self._stop.wait(backoff)
+                    backoff = min(self.refill_interval, backoff * 2)
+                    continue
+            self._wanted.wait(self.refill_interval)
+            self._wanted.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fact-buffer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wanted.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
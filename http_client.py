@@ -0,0 +1,168 @@
+######################################################################################
+# Shared HTTP client layer
+#
+# One keep-alive requests.Session per upstream host, so the Webex and fact API
+# calls reuse pooled TCP+TLS connections instead of handshaking on every call.
+# Each host gets its own pool size, retry policy and (connect, read) timeouts.
+######################################################################################
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import UPSTREAM_RESPONSES, status_class
+
+
+class HostProfile:
+    def __init__(
+        self,
+        pool_maxsize=10,
+        retries=2,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        connect_timeout=3.05,
+        read_timeout=10,
+    ):
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        # 429 is left to the callers: they know whether to wait or give up
+        self.status_forcelist = status_forcelist
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def make_retry(self):
+        # urllib3 never retries POST on a status code, so replies are not
+        # duplicated; connection errors happen before the request is sent
+        return Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+
+
+DEFAULT_PROFILE = HostProfile()
+
+HOST_PROFILES = {
+    "webexapis.com": HostProfile(pool_maxsize=20, read_timeout=10),
+    # The fact API is a nice-to-have; fail fast rather than hold up replies
+    "uselessfacts.jsph.pl": HostProfile(pool_maxsize=5, retries=1, read_timeout=5),
+}
+
+
+class HttpClients:
+    def __init__(self, profiles=None, default_profile=DEFAULT_PROFILE):
+        self.profiles = HOST_PROFILES if profiles is None else profiles
+        self.default_profile = default_profile
+        self._sessions = {}
+        self._last_outcome = {}  # host -> (status class, monotonic time)
+        self._lock = threading.Lock()
+
+    def profile_for(self, host):
+        return self.profiles.get(host, self.default_profile)
+
+    def _session(self, url):
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                profile = self.profile_for(parts.hostname)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=profile.pool_maxsize,
+                    max_retries=profile.make_retry(),
+                )
+                session = requests.Session()
+                session.mount(f"{parts.scheme}://", adapter)
+                entry = (session, adapter, profile)
+                self._sessions[key] = entry
+        return entry
+
+    def _record(self, host, status_code):
+        outcome = status_class(status_code)
+        UPSTREAM_RESPONSES.labels(upstream=host, status_class=outcome).inc()
+        self._last_outcome[host] = (outcome, time.monotonic())
+
+    def request(self, method, url, **kwargs):
+        session, _, profile = self._session(url)
+        kwargs.setdefault("timeout", profile.timeout)
+        host = urlsplit(url).hostname
+        try:
+            resp = session.request(method, url, **kwargs)
+        except Exception:
+            self._record(host, None)
+            raise
+        self._record(host, resp.status_code)
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """Requests, new connections and reused connections per host."""
+        result = {}
+        with self._lock:
+            entries = list(self._sessions.items())
+        for key, (_, adapter, _) in entries:
+            requests_made = new_connections = 0
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                requests_made += pool.num_requests
+                new_connections += pool.num_connections
+            result[key] = {
+                "requests": requests_made,
+                "new_connections": new_connections,
+                "reused_connections": max(0, requests_made - new_connections),
+            }
+        return result
+
+    def upstream_status(self):
+        """Whether each host answered its last call, and how long ago that was."""
+        now = time.monotonic()
+        return {
+            host: {
+                "reachable": outcome not in ("error", "5xx"),
+                "last_status": outcome,
+                "seconds_ago": round(now - at, 1),
+            }
+            for host, (outcome, at) in list(self._last_outcome.items())
+        }
+
+    def close(self):
+        with self._lock:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+        for session, _, _ in entries:
+            session.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_clients():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = HttpClients()
+        return _default
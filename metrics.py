@@ -0,0 +1,89 @@
+######################################################################################
+# Prometheus metrics
+#
+# Everything the bot reports on /metrics lives here so the other modules only
+# import what they observe. Metric updates are a lock and an add each, cheap
+# enough for the hot path (see tests/test_metrics.py).
+######################################################################################
+
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets from a fast local call up to the 10s upstream timeouts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS_TOTAL = Counter(
+    "webexbot_requests_total",
+    "HTTP requests received by the bot app.",
+    ["endpoint"],
+)
+
+POLL_SECONDS = Histogram(
+    "webexbot_poll_seconds",
+    "Time to fetch new messages for one room, all pages included.",
+    buckets=LATENCY_BUCKETS,
+)
+
+FACT_FETCH_SECONDS = Histogram(
+    "webexbot_fact_fetch_seconds",
+    "Time to fetch one fact from the fact API.",
+    buckets=LATENCY_BUCKETS,
+)
+
+RENDER_SECONDS = Histogram(
+    "webexbot_render_seconds",
+    "Time to build the markdown for one fact; fetching it is not included.",
+    buckets=LATENCY_BUCKETS,
+)
+
+SEND_SECONDS = Histogram(
+    "webexbot_send_seconds",
+    "Time to POST one reply to Webex.",
+    buckets=LATENCY_BUCKETS,
+)
+
+QUEUE_DEPTH = Gauge(
+    "webexbot_queue_depth",
+    "Items waiting in each internal queue.",
+    ["queue"],
+)
+
+POLL_INTERVAL = Gauge(
+    "webexbot_poll_interval_seconds",
+    "Current poll interval per room.",
+    ["room"],
+)
+
+UPSTREAM_RESPONSES = Counter(
+    "webexbot_upstream_responses_total",
+    "Responses from upstream APIs by status class (or 'error' for no response).",
+    ["upstream", "status_class"],
+)
+
+
+def status_class(status_code):
+    if status_code is None:
+        return "error"
+    return f"{status_code // 100}xx"
+
+
+######################################################################################
+# Liveness
+######################################################################################
+
+_heartbeats = {}
+_heartbeats_lock = threading.Lock()
+
+
+def heartbeat(name):
+    """Record that a background loop just did some work."""
+    with _heartbeats_lock:
+        _heartbeats[name] = time.monotonic()
+
+
+def seconds_since_heartbeat(name):
+    with _heartbeats_lock:
+        last = _heartbeats.get(name)
+    return None if last is None else time.monotonic() - last
@@ -0,0 +1,169 @@
+######################################################################################
+# Concurrent command-handling pipeline
+#
+# Ingestion (webhook or poller) submits work keyed by room; a pool of worker
+# threads handles it. Different rooms run concurrently, while work for the same
+# room runs one at a time in submission order so replies stay ordered.
+#
+# The pipeline is bounded: once max_pending items are waiting, submit() blocks
+# (or fails when block=False) so ingestion slows down instead of piling up work.
+######################################################################################
+
+import threading
+import time
+from collections import deque
+
+
+class PipelineClosed(Exception):
+    pass
+
+
+class WorkerPool:
+    """Threads, counting and shutdown shared by Pipeline and ReplyDispatcher.
+
+    Subclasses keep self._count up to date under self._cond, implement _worker()
+    and return from it once self._stopping is set (or once closing and idle).
+    """
+
+    def __init__(self, workers, name):
+        self.workers = workers
+        self.name = name
+        self._cond = threading.Condition()
+        self._count = 0
+        self._closing = False
+        self._stopping = False
+        self._threads = []
+
+    def qsize(self):
+        with self._cond:
+            return self._count
+
+    def alive(self):
+        """True once started and while every worker thread is running."""
+        return bool(self._threads) and all(t.is_alive() for t in self._threads)
+
+    def clear(self):
+        """Called by shutdown(drain=False); nothing to drop unless overridden."""
+        return []
+
+    def _worker(self):
+        raise NotImplementedError
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return self
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def join(self, timeout=None):
+        """Wait until everything queued so far has been handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, drain=True, timeout=None):
+        """Stop accepting work, optionally finish what is queued, stop workers."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if drain:
+            self.join(timeout)
+        else:
+            self.clear()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+
+class Pipeline(WorkerPool):
+    def __init__(self, handler, workers=4, max_pending=1000, name="pipeline"):
+        super().__init__(workers, name)
+        self.handler = handler
+        self.max_pending = max_pending
+
+        self._pending = {}  # key -> deque of items, kept while the key is active
+        self._ready = deque()  # keys with pending items and no running worker
+        self._active = set()
+
+    def submit(self, key, item, block=True, timeout=None):
+        """Queue an item. Returns False if the pipeline stayed full."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._count >= self.max_pending and not self._closing:
+                if not block:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if self._closing:
+                raise PipelineClosed(f"{self.name} is shutting down")
+
+            items = self._pending.get(key)
+            if items is None:
+                items = self._pending[key] = deque()
+                self._ready.append(key)
+            items.append(item)
+            self._count += 1
+            self._cond.notify_all()
+            return True
+
+    def clear(self):
+        """Drop everything that has not started yet. Returns the dropped items."""
+        dropped = []
+        with self._cond:
+            for key in list(self._pending):
+                dropped.extend(self._pending[key])
+                self._pending[key].clear()
+                if key not in self._active:
+                    del self._pending[key]
+            self._ready.clear()
+            self._count -= len(dropped)
+            self._cond.notify_all()
+        return dropped
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None, None
+                if self._ready:
+                    break
+                self._cond.wait()
+            key = self._ready.popleft()
+            self._active.add(key)
+            return key, self._pending[key].popleft()
+
+    def _done(self, key):
+        with self._cond:
+            self._active.discard(key)
+            self._count -= 1
+            if self._pending[key]:
+                self._ready.append(key)
+            else:
+                del self._pending[key]
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            key, item = self._next()
+            if key is None:
+                return
+            try:
+                self.handler(item)
+            except Exception as e:
+                print(f"[ERROR] Unhandled error in {self.name} worker: {e}")
+            finally:
+                self._done(key)
@@ -0,0 +1,190 @@
+######################################################################################
+# Cursor-based batch polling
+#
+# Instead of looking at only the newest message once a second, the poller keeps a
+# cursor (the last message it handed off) and pages backwards through
+# GET /messages with beforeMessage until it reaches that cursor. Everything newer
+# is handled oldest-first in one pass, so two commands sent in the same second are
+# both answered. Paging only stops at the cursor, so even a long backlog (e.g.
+# after downtime) is caught up on in full; on_page lets a caller pay for each
+# extra page from a rate budget.
+#
+# The poll interval adapts: it drops to the minimum as soon as messages arrive,
+# grows while the room is quiet, and honours Retry-After when Webex throttles.
+######################################################################################
+
+from collections import deque
+
+from metrics import POLL_INTERVAL, POLL_SECONDS, heartbeat
+from webex_client import WebexApiError
+
+######################################################################################
+# Constants
+######################################################################################
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_PAGES = None  # no cap: page until the cursor
+RECENT_IDS_LIMIT = 1000
+
+
+class AdaptiveInterval:
+    def __init__(self, minimum=1.0, maximum=30.0, factor=1.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.current = minimum
+
+    def on_activity(self):
+        self.current = self.minimum
+
+    def on_idle(self):
+        self.current = min(self.maximum, self.current * self.factor)
+
+    def on_error(self):
+        self.current = min(self.maximum, self.current * 2)
+
+    def on_throttle(self, retry_after=None):
+        # Retry-After is a floor, not a suggestion; it may exceed our maximum
+        backoff = min(self.maximum, self.current * 2)
+        self.current = max(backoff, retry_after or 0.0)
+
+
+class RoomPoller:
+    def __init__(
+        self,
+        client,
+        room_id,
+        handler,
+        interval=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        max_pages=DEFAULT_MAX_PAGES,
+        cursor=None,
+        on_prime=None,
+        on_page=None,
+    ):
+        self.client = client
+        self.room_id = room_id
+        self.handler = handler
+        self.interval = interval or AdaptiveInterval()
+        self.page_size = page_size
+        self.max_pages = max_pages
+        # cursor is {"id": ..., "created": ...} of the newest handled message
+        self.cursor = cursor
+        # on_prime(room_id, message_id, created) lets the starting point persist
+        self.on_prime = on_prime
+        # on_page() is called before every page after the first
+        self.on_page = on_page
+        self._recent_ids = deque(maxlen=RECENT_IDS_LIMIT)
+        self._recent_set = set()
+        # What the last poll_once cost and whether Webex asked us to back off
+        self.last_calls = 0
+        self.last_retry_after = None
+
+    def _remember(self, message_id):
+        if len(self._recent_ids) == self._recent_ids.maxlen:
+            self._recent_set.discard(self._recent_ids[0])
+        self._recent_ids.append(message_id)
+        self._recent_set.add(message_id)
+
+    def _is_behind_cursor(self, message):
+        if message.get("id") == self.cursor.get("id"):
+            return True
+        created = message.get("created", "")
+        # ISO-8601 timestamps from Webex compare correctly as strings
+        return bool(created) and created < self.cursor.get("created", "")
+
+    def prime(self):
+        """Start from the newest message so history is not replayed."""
+        self.last_calls += 1
+        items = self.client.list_messages(self.room_id, max_items=1)
+        if items:
+            newest = items[0]
+            self.cursor = {"id": newest.get("id"), "created": newest.get("created", "")}
+        else:
+            self.cursor = {"id": None, "created": ""}
+        if self.on_prime is not None:
+            self.on_prime(self.room_id, self.cursor["id"], self.cursor["created"])
+
+    def fetch_new(self):
+        """Return every message newer than the cursor, oldest first."""
+        if self.cursor is None:
+            self.prime()
+            return []
+
+        new_messages = []
+        before_message = None
+        pages = 0
+
+        while True:
+            if pages and self.on_page is not None:
+                self.on_page()
+            pages += 1
+            self.last_calls += 1
+            page = self.client.list_messages(
+                self.room_id, max_items=self.page_size, before_message=before_message
+            )
+            reached_cursor = False
+            for message in page:
+                if self._is_behind_cursor(message):
+                    reached_cursor = True
+                    break
+                if message.get("id") not in self._recent_set:
+                    new_messages.append(message)
+
+            if reached_cursor or len(page) < self.page_size:
+                break
+            if self.max_pages is not None and pages >= self.max_pages:
+                print(
+                    f"[WARN] More than {self.max_pages * self.page_size} new messages in "
+                    f"{self.room_id}; older ones were skipped (max_pages is set)."
+                )
+                break
+            before_message = page[-1].get("id")
+
+        new_messages.reverse()
+        return new_messages
+
+    def poll_once(self):
+        """Poll once, hand new messages to the handler and adapt the interval."""
+        self.last_calls = 0
+        self.last_retry_after = None
+        heartbeat("poller")
+        try:
+            with POLL_SECONDS.time():
+                messages = self.fetch_new()
+        except WebexApiError as e:
+            if e.status_code == 429:
+                self.last_retry_after = e.retry_after or self.interval.current * 2
+                self.interval.on_throttle(e.retry_after)
+                print(
+                    f"[WARN] Webex throttled /messages; "
+                    f"waiting {self.interval.current:.1f}s"
+                )
+            else:
+                self.interval.on_error()
+                print(f"[ERROR] Webex /messages returned {e.status_code}: {e.text}")
+            return 0
+        except Exception as e:
+            self.interval.on_error()
+            print(f"[ERROR] Failed to contact Webex API for messages: {e}")
+            return 0
+
+        if not messages:
+            self.interval.on_idle()
+            return 0
+
+        for message in messages:
+            self.cursor = {"id": message.get("id"), "created": message.get("created", "")}
+            self._remember(message.get("id"))
+            try:
+                self.handler(message)
+            except Exception as e:
+                print(f"[ERROR] Failed to handle message {message.get('id')}: {e}")
+
+        self.interval.on_activity()
+        return len(messages)
+
+    def run(self, stop_event):
+        while not stop_event.wait(self.interval.current):
+            self.poll_once()
+            POLL_INTERVAL.labels(room=self.room_id).set(self.interval.current)
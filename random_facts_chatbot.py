@@ -3,8 +3,13 @@
 #
 # This program:
 # - Loads config (WEBEX_ROOM_ID, etc.) from a .env file.
-# - ALWAYS asks the user for their Webex Personal Access Token at runtime.
-# - Monitors the configured Webex room for "/fact" commands.
+# - ALWAYS asks the user for their Webex Personal Access Token at runtime,
+#   unless started with --non-interactive (then WEBEX_ACCESS_TOKEN is used,
+#   e.g. by bench/run_bench.py).
+# - Monitors the configured Webex room for "/fact" commands by polling.
+#   (For webhook delivery instead of polling, run app.py.)
+# - Remembers where it stopped (bot_state.sqlite3), so a restart catches up on
+#   commands sent while it was down and never answers a message twice.
 # - Calls the uselessfacts API at https://uselessfacts.jsph.pl/api/v2/facts/random
 #   to get a random fact.
 # - Sends the fact back to the Webex room as a markdown message.
@@ -13,20 +18,22 @@
 #   WEBEX_ROOM_ID=Y2lzY29zcGFyazovL3VybjpURUFNOnVzLXdlc3QtMl9yL1JPT00v...
 #   WEBEX_BOT_TOKEN=optional-bot-token-if-you-have-one
 #   WEBEX_BOT_EMAIL=myWeather-bot@webex.bot
+#   WEBEX_API_BASE / FACT_API_URL (optional, to point the bot at other servers)
 ######################################################################################
 
 import os
-import time
-import json
-import requests
+import sys
+import threading
 from dotenv import load_dotenv
 
-######################################################################################
-# Constants
-######################################################################################
-
-WEBEX_API_BASE = "https://webexapis.com/v1"
-FACT_API_URL = "https://uselessfacts.jsph.pl/api/v2/facts/random"
+from bot import lookup_room_title, process_message
+from dispatcher import ReplyDispatcher
+from facts import FACT_API_URL, FactBuffer
+from http_client import default_clients
+from pipeline import Pipeline
+from poller import RoomPoller
+from state_store import StateStore
+from webex_client import WEBEX_API_BASE, WebexClient
 
 ######################################################################################
 # Load environment variables
@@ -36,6 +43,15 @@ load_dotenv()
 
 WEBEX_ROOM_ID = os.getenv("WEBEX_ROOM_ID")
 WEBEX_BOT_TOKEN = os.getenv("WEBEX_BOT_TOKEN")  # not used right now, but available
+WEBEX_API_BASE = os.getenv("WEBEX_API_BASE", WEBEX_API_BASE)
+FACT_API_URL = os.getenv("FACT_API_URL", FACT_API_URL)
+NON_INTERACTIVE = "--non-interactive" in sys.argv[1:]
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(BOT_DIR, "bot_state.sqlite3"))
+FACT_CORPUS_PATH = os.getenv(
+    "FACT_CORPUS_PATH", os.path.join(BOT_DIR, "fact_corpus.jsonl")
+)
 
 if not WEBEX_ROOM_ID:
     raise RuntimeError(
@@ -45,44 +61,32 @@ if not WEBEX_ROOM_ID:
 print(f"Loaded room ID from .env: {WEBEX_ROOM_ID}")
 
 ######################################################################################
-# Ask user for Personal Access Token (ALWAYS)
+# Ask user for Personal Access Token (ALWAYS, unless --non-interactive)
 ######################################################################################
 
-personal_access_token = input(
-    "Enter your Webex Personal Access Token (NOT the bot token): "
-).strip()
+if NON_INTERACTIVE:
+    personal_access_token = os.getenv("WEBEX_ACCESS_TOKEN", "").strip()
+else:
+    personal_access_token = input(
+        "Enter your Webex Personal Access Token (NOT the bot token): "
+    ).strip()
 
 if not personal_access_token:
     raise RuntimeError("A Webex Personal Access Token is required to continue.")
 
-accessToken = "Bearer " + personal_access_token
+client = WebexClient(personal_access_token, api_base=WEBEX_API_BASE)
+store = StateStore(STATE_DB_PATH)
 
 ######################################################################################
-# Optional: Look up the room title for nicer logging
+# Optional: Look up the room title for nicer logging (cached between runs)
 ######################################################################################
 
 room_title = "(Unknown Title)"
 
 try:
-    rooms_resp = requests.get(
-        f"{WEBEX_API_BASE}/rooms",
-        headers={"Authorization": accessToken},
-        timeout=10,
-    )
-
-    if rooms_resp.status_code == 200:
-        items = rooms_resp.json().get("items", [])
-        for room in items:
-            if room.get("id") == WEBEX_ROOM_ID:
-                room_title = room.get("title", room_title)
-                break
-    else:
-        print(
-            f"[WARN] Could not look up rooms. "
-            f"Status {rooms_resp.status_code}: {rooms_resp.text}"
-        )
+    room_title = lookup_room_title(client, WEBEX_ROOM_ID, store=store)
 except Exception as e:
-    print(f"[WARN] Exception while looking up rooms: {e}")
+    print(f"[WARN] Could not look up rooms: {e}")
 
 print("\n--------------------------------------------------")
 print(f"Monitoring Webex room:\n - ID: {WEBEX_ROOM_ID}\n - Title: {room_title}")
@@ -92,117 +96,38 @@ print("Waiting for /fact commands...\n")
 # Polling loop
 ######################################################################################
 
-last_message_id = None  # track last processed message to avoid reprocessing
-
-while True:
-    time.sleep(1)
+fact_buffer = FactBuffer(url=FACT_API_URL, corpus_path=FACT_CORPUS_PATH).start()
 
-    params = {
-        "roomId": WEBEX_ROOM_ID,
-        "max": 1,  # only need the latest message
-    }
+# Replies are rate limited and retried on 429 instead of being dropped
+dispatcher = ReplyDispatcher(client).start()
 
-    # Get latest message from the room
-    try:
-        msg_resp = requests.get(
-            f"{WEBEX_API_BASE}/messages",
-            params=params,
-            headers={"Authorization": accessToken},
-            timeout=10,
-        )
-    except Exception as e:
-        print(f"[ERROR] Failed to contact Webex API for messages: {e}")
-        continue
-
-    if msg_resp.status_code != 200:
-        print(
-            f"[ERROR] Webex /messages returned {msg_resp.status_code}: "
-            f"{msg_resp.text}"
-        )
-        continue
-
-    items = msg_resp.json().get("items", [])
-    if not items:
-        # No messages in the room yet
-        continue
-
-    latest = items[0]
-    message_id = latest.get("id")
-    message_text = latest.get("text", "").strip()
-
-    # Avoid processing the same message over and over
-    if message_id == last_message_id:
-        continue
-    last_message_id = message_id
-
-    print(f"Received: {message_text}")
-
-    # Only act on /fact commands
-    if not message_text.lower().startswith("/fact"):
-        continue
-
-    ###############################################################################
-    # Call the uselessfacts API
-    ###############################################################################
-
-    try:
-        fact_resp = requests.get(FACT_API_URL, timeout=10)
-
-        if fact_resp.status_code != 200:
-            raise Exception(
-                f"Fact API returned {fact_resp.status_code}: {fact_resp.text}"
-            )
-
-        fact_json = fact_resp.json()
-
-        # For https://uselessfacts.jsph.pl/api/v2/facts/random
-        fact_text = fact_json.get("text", "No fact text found.")
-        source = fact_json.get("source", "unknown")
-        source_url = fact_json.get("source_url", "")
-
-        if source_url:
-            reply_markdown = (
-                f"🧠 **Random Useless Fact**\n\n"
-                f"{fact_text}\n\n"
-                f"_Source: [{source}]({source_url})_"
-            )
-        else:
-            reply_markdown = f"🧠 **Random Useless Fact**\n\n{fact_text}"
-
-    except Exception as e:
-        print(f"[ERROR] Fact API error: {e}")
-        reply_markdown = (
-            "⚠️ Sorry! I couldn't retrieve a fact right now. "
-            "Please try again later."
-        )
+# Reading messages never waits on a reply being built and sent
+pipeline = Pipeline(
+    lambda message: process_message(
+        client, message, store=store, facts=fact_buffer, dispatcher=dispatcher
+    )
+).start()
 
-    ###############################################################################
-    # Send the reply back to the Webex room
-    ###############################################################################
-
-    post_payload = {
-        "roomId": WEBEX_ROOM_ID,
-        "markdown": reply_markdown,
-    }
-
-    try:
-        send_resp = requests.post(
-            f"{WEBEX_API_BASE}/messages",
-            headers={
-                "Authorization": accessToken,
-                "Content-Type": "application/json",
-            },
-            data=json.dumps(post_payload),
-            timeout=10,
-        )
-    except Exception as e:
-        print(f"[ERROR] Failed to send message to Webex: {e}")
-        continue
+poller = RoomPoller(
+    client,
+    WEBEX_ROOM_ID,
+    lambda message: pipeline.submit(message.get("roomId"), message),
+    # Resume after the last handled message instead of starting from the newest
+    cursor=store.get_cursor(WEBEX_ROOM_ID),
+    on_prime=store.set_cursor,
+)
 
-    if send_resp.status_code != 200:
+try:
+    poller.run(threading.Event())
+except KeyboardInterrupt:
+    print("\nStopping, finishing queued commands...")
+    pipeline.shutdown(drain=True, timeout=30)
+    dispatcher.shutdown(drain=True, timeout=30)
+    fact_buffer.stop()
+    store.close()
+    print("Stopped.")
+    for host, counts in default_clients().stats().items():
         print(
-            f"[ERROR] Failed to send message. "
-            f"Status {send_resp.status_code}: {send_resp.text}"
+            f"{host}: {counts['requests']} requests, "
+            f"{counts['reused_connections']} on reused connections"
         )
-    else:
-        print("✔️ Fact sent!\n")
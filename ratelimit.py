@@ -0,0 +1,76 @@
+######################################################################################
+# Token bucket rate limiting
+######################################################################################
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        """rate is tokens per second; capacity is the largest burst allowed."""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def pause(self, seconds):
+        """Hand out nothing for the next `seconds`, e.g. for a 429's Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+    def try_acquire(self, n=1):
+        with self._lock:
+            self._refill()
+            if self._updated < self._paused_until:
+                return False
+            if self._tokens >= n:
+                self._tokens -= n
+                return True
+            return False
+
+    def debit(self, n):
+        """Charge for calls already made; the balance may go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens -= n
+
+    def wait_time(self, n=1):
+        """Seconds until n tokens are available (0 if they already are)."""
+        with self._lock:
+            self._refill()
+            missing = n - self._tokens
+            wait = 0.0 if missing <= 0 else missing / self.rate
+            return max(wait, self._paused_until - self._updated)
+
+    def acquire(self, n=1, timeout=None, stop_event=None):
+        """Block until n tokens are taken. Returns False on timeout or stop."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            if self.try_acquire(n):
+                return True
+            wait = self.wait_time(n)
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
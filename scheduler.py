@@ -0,0 +1,228 @@
+######################################################################################
+# Multi-room poll scheduler
+#
+# Serves many rooms from one process. Every room has its own RoomPoller (cursor +
+# adaptive interval); the scheduler keeps them in a heap ordered by when each is
+# next due, so busy rooms come round every few seconds while idle ones drift out
+# to the maximum interval. All rooms share one HTTP pool and one token bucket of
+# Webex calls per minute, and a 429 in any room pauses them all, since the rate
+# limit is per token rather than per room. Pass the same bucket to the
+# ReplyDispatcher and replies draw from (and are paused by) that budget too.
+#
+# Rooms can be added or removed at any time, e.g. from a rooms file that is
+# re-read when it changes.
+######################################################################################
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+
+from metrics import POLL_INTERVAL, heartbeat
+from poller import DEFAULT_MAX_PAGES, DEFAULT_PAGE_SIZE, AdaptiveInterval, RoomPoller
+from ratelimit import TokenBucket
+
+######################################################################################
+# Constants
+######################################################################################
+
+DEFAULT_BUDGET_PER_MINUTE = 300
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+
+
+def calls_per_minute_bucket(calls_per_minute):
+    """A Webex call budget allowing roughly ten seconds' worth of calls as a burst."""
+    return TokenBucket(calls_per_minute / 60.0, capacity=max(1.0, calls_per_minute / 6.0))
+
+
+class RoomScheduler:
+    def __init__(
+        self,
+        client,
+        handler,
+        room_ids=(),
+        budget_per_minute=DEFAULT_BUDGET_PER_MINUTE,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        workers=4,
+        page_size=DEFAULT_PAGE_SIZE,
+        max_pages=DEFAULT_MAX_PAGES,
+        store=None,
+        budget=None,
+    ):
+        self.client = client
+        # Optional StateStore: resume each room from its saved cursor
+        self.store = store
+        self.handler = handler
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.workers = workers
+        self.page_size = page_size
+        self.max_pages = max_pages
+        # Calls per access token; may be shared with the ReplyDispatcher
+        self.budget = budget or calls_per_minute_bucket(budget_per_minute)
+        self.calls_by_room = Counter()
+
+        self._cond = threading.Condition()
+        self._rooms = {}  # room_id -> RoomPoller
+        self._heap = []  # (due, seq, poller); stale entries are skipped
+        self._seq = itertools.count()
+
+        for room_id in room_ids:
+            self.add_room(room_id)
+
+    ##################################################################################
+    # Room set
+    ##################################################################################
+
+    @property
+    def room_ids(self):
+        with self._cond:
+            return list(self._rooms)
+
+    def add_room(self, room_id):
+        with self._cond:
+            if room_id in self._rooms:
+                return
+            poller = RoomPoller(
+                self.client,
+                room_id,
+                self.handler,
+                interval=AdaptiveInterval(self.min_interval, self.max_interval),
+                page_size=self.page_size,
+                max_pages=self.max_pages,
+                # Catching up on a backlog pays for every page it fetches
+                on_page=self.budget.acquire,
+                cursor=self.store.get_cursor(room_id) if self.store else None,
+                on_prime=self.store.set_cursor if self.store else None,
+            )
+            self._rooms[room_id] = poller
+            heapq.heappush(self._heap, (time.monotonic(), next(self._seq), poller))
+            self._cond.notify_all()
+        print(f"Monitoring Webex room: {room_id}")
+
+    def remove_room(self, room_id):
+        with self._cond:
+            if self._rooms.pop(room_id, None) is None:
+                return
+            self._cond.notify_all()
+        try:
+            POLL_INTERVAL.remove(room_id)
+        except KeyError:
+            pass
+        print(f"Stopped monitoring Webex room: {room_id}")
+
+    def sync_rooms(self, room_ids):
+        wanted = set(room_ids)
+        for room_id in set(self.room_ids) - wanted:
+            self.remove_room(room_id)
+        for room_id in room_ids:
+            self.add_room(room_id)
+
+    def active_rooms(self):
+        """Rooms currently polled at the fastest rate."""
+        with self._cond:
+            return sum(
+                1 for p in self._rooms.values()
+                if p.interval.current <= self.min_interval
+            )
+
+    ##################################################################################
+    # Scheduling
+    ##################################################################################
+
+    def _is_current(self, poller):
+        return self._rooms.get(poller.room_id) is poller
+
+    def _next_due(self, stop_event):
+        with self._cond:
+            while not stop_event.is_set():
+                # Drop heap entries for rooms that were removed (or re-added)
+                while self._heap and not self._is_current(self._heap[0][2]):
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait(0.5)
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(min(wait, 0.5))
+                    continue
+                return heapq.heappop(self._heap)[2]
+        return None
+
+    def _reschedule(self, poller):
+        now = time.monotonic()
+        with self._cond:
+            self.calls_by_room[poller.room_id] += poller.last_calls
+            if poller.last_retry_after:
+                # Workers block in budget.acquire until the pause is over
+                self.budget.pause(poller.last_retry_after)
+            if self._is_current(poller):
+                POLL_INTERVAL.labels(room=poller.room_id).set(poller.interval.current)
+                due = now + poller.interval.current
+                heapq.heappush(self._heap, (due, next(self._seq), poller))
+            self._cond.notify_all()
+
+    def _worker(self, stop_event):
+        while True:
+            poller = self._next_due(stop_event)
+            if poller is None:
+                return
+            if not self.budget.acquire(stop_event=stop_event):
+                return
+            try:
+                # The first call was paid for up front, extra pages via on_page
+                poller.poll_once()
+            finally:
+                self._reschedule(poller)
+
+    def run(self, stop_event):
+        heartbeat("poller")
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(stop_event,), name=f"scheduler-{i}", daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+######################################################################################
+# Rooms file
+######################################################################################
+
+def read_room_ids(path):
+    """One room ID per line; blank lines and # comments are ignored."""
+    room_ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line and line not in room_ids:
+                room_ids.append(line)
+    return room_ids
+
+
+def watch_rooms_file(scheduler, path, stop_event, every=10.0, static_room_ids=()):
+    """Re-read the rooms file whenever it changes and sync the scheduler.
+
+    Rooms in static_room_ids (e.g. from the environment) are always kept.
+    """
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != last_mtime:
+                room_ids = list(static_room_ids)
+                room_ids += [r for r in read_room_ids(path) if r not in room_ids]
+                scheduler.sync_rooms(room_ids)
+                last_mtime = mtime
+        except OSError as e:
+            print(f"[WARN] Could not read rooms file {path}: {e}")
+        if stop_event.wait(every):
+            return
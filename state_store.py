@@ -0,0 +1,133 @@
+######################################################################################
+# Durable bot state
+#
+# A small SQLite file (stdlib only) that survives restarts:
+# - the per-room cursor, so polling resumes where it stopped and catches up on
+#   anything sent while the bot was down;
+# - a bounded set of processed message IDs, so a message is never answered twice
+#   (webhook redeliveries, poll overlap, restarts);
+# - cached room metadata, so startup does not need GET /rooms every time.
+######################################################################################
+
+import sqlite3
+import threading
+import time
+
+######################################################################################
+# Constants
+######################################################################################
+
+DEFAULT_PROCESSED_LIMIT = 10000
+DEFAULT_ROOM_MAX_AGE = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    room_id TEXT PRIMARY KEY,
+    message_id TEXT,
+    created TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS processed (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL UNIQUE,
+    room_id TEXT
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id TEXT PRIMARY KEY,
+    title TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class StateStore:
+    def __init__(self, path, processed_limit=DEFAULT_PROCESSED_LIMIT):
+        self.path = path
+        self.processed_limit = processed_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL + NORMAL: a crash may lose the last write, never corrupt the file
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._inserts_since_trim = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    ##################################################################################
+    # Cursors
+    ##################################################################################
+
+    def get_cursor(self, room_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_id, created FROM cursors WHERE room_id = ?", (room_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "created": row[1]}
+
+    def set_cursor(self, room_id, message_id, created):
+        with self._lock:
+            # Never move a cursor backwards, e.g. for a late webhook redelivery
+            self._conn.execute(
+                "INSERT INTO cursors (room_id, message_id, created) VALUES (?, ?, ?) "
+                "ON CONFLICT(room_id) DO UPDATE SET "
+                "message_id = excluded.message_id, created = excluded.created "
+                "WHERE excluded.created >= cursors.created",
+                (room_id, message_id, created or ""),
+            )
+
+    ##################################################################################
+    # Processed messages
+    ##################################################################################
+
+    def is_processed(self, message_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return row is not None
+
+    def mark_processed(self, message_id, room_id=None):
+        """Record a message as handled. Returns False if it already was."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO processed (message_id, room_id) VALUES (?, ?)",
+                (message_id, room_id),
+            )
+            if cur.rowcount == 0:
+                return False
+            self._inserts_since_trim += 1
+            # Trimming on every insert would double the writes; batch it
+            if self._inserts_since_trim >= max(1, self.processed_limit // 10):
+                self._conn.execute(
+                    "DELETE FROM processed WHERE seq <= "
+                    "(SELECT MAX(seq) FROM processed) - ?",
+                    (self.processed_limit,),
+                )
+                self._inserts_since_trim = 0
+            return True
+
+    ##################################################################################
+    # Room metadata
+    ##################################################################################
+
+    def get_room(self, room_id, max_age=DEFAULT_ROOM_MAX_AGE):
+        """Cached room metadata, or None if missing or older than max_age."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, fetched_at FROM rooms WHERE room_id = ?", (room_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        return {"id": room_id, "title": row[0]}
+
+    def put_room(self, room_id, title):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rooms (room_id, title, fetched_at) VALUES (?, ?, ?)",
+                (room_id, title, time.time()),
+            )
@@ -0,0 +1,71 @@
+import copy
+
+from bench.run_bench import SCHEMA_VERSION, _match_replies, compare, run_benchmark
+from bench.stub_servers import StubWebex
+from commands import FACT_SEPARATOR
+from dispatcher import COALESCE_SEPARATOR
+
+
+def test_script_benchmark_answers_every_command_once():
+    result = run_benchmark(target="script", rate=120, duration=3, arrival="uniform")
+
+    r = result["results"]
+    assert result["schema"] == SCHEMA_VERSION
+    assert r["commands"] == 6
+    assert r["missed"] == 0
+    assert r["duplicates"] == 0
+    assert r["latency_ms"]["p50"] is not None
+    assert r["upstream_calls"]["POST /v1/messages"] == 6
+
+
+def test_script_benchmark_retries_throttled_replies():
+    result = run_benchmark(
+        target="script", rate=120, duration=3, arrival="uniform", throttle_probability=0.2
+    )
+
+    r = result["results"]
+    assert r["upstream_calls"]["429 responses"] > 0
+    assert r["missed"] == 0
+    assert r["duplicates"] == 0
+
+
+def test_multi_fact_replies_count_as_one_answer():
+    webex = StubWebex()
+    two_facts = FACT_SEPARATOR.join(["fact b", "fact c"])
+    webex.sent = [
+        {"roomId": "r1", "markdown": COALESCE_SEPARATOR.join(["fact a", two_facts])},
+        {"roomId": "r1", "markdown": two_facts},
+    ]
+    webex.sent_times = [1.0, 2.0]
+    webex.server.server_close()
+
+    latencies, replies, missed, duplicates = _match_replies(webex, {"r1": [0.5, 0.75, 1.5]})
+    assert (replies, missed, duplicates) == (3, 0, 0)
+    assert latencies == [500.0, 250.0, 500.0]
+
+
+def test_compare_flags_regressions_only_beyond_tolerance():
+    baseline = {
+        "schema": SCHEMA_VERSION,
+        "revision": "abc",
+        "config": {"rate_per_min": 120},
+        "results": {
+            "missed": 0,
+            "duplicates": 0,
+            "latency_ms": {"p50": 200.0, "p90": 400.0, "p99": 800.0},
+            "throughput_per_s": 2.0,
+            "webex_calls_per_command": 2.0,
+        },
+    }
+    result = copy.deepcopy(baseline)
+    result["results"]["latency_ms"]["p90"] = 450.0
+    assert compare(result, baseline) == []
+
+    result["results"]["latency_ms"]["p99"] = 2000.0
+    result["results"]["missed"] = 1
+    regressions = compare(result, baseline)
+    assert len(regressions) == 2
+    assert any("p99" in line for line in regressions)
+
+    result["config"] = {"rate_per_min": 600}
+    assert compare(result, baseline) == ["configs differ; rerun both revisions with the same options"]
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from dispatcher import COALESCE_SEPARATOR, ReplyDispatcher
+from bench.stub_servers import StubWebex
+from webex_client import WebexApiError, WebexClient
+
+
+class FlakyClient:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def post_message(self, room_id, markdown):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.sent.append((room_id, markdown))
+
+
+def test_failed_sends_are_retried_and_429_pauses_sending():
+    client = FlakyClient([
+        WebexApiError(503, "busy"),
+        WebexApiError(429, "slow down", retry_after=0.2),
+    ])
+    d = ReplyDispatcher(client, token_rate=100, token_burst=10, base_backoff=0.01).start()
+    start = time.monotonic()
+    d.send("r1", "one")
+    assert d.join(timeout=5)
+    d.shutdown()
+    assert client.sent == [("r1", "one")]
+    assert time.monotonic() - start >= 0.2
+    assert d.stats["retried"] == 1 and d.stats["throttled"] == 1
+
+
+def test_client_errors_are_not_retried():
+    client = FlakyClient([WebexApiError(400, "bad room")])
+    d = ReplyDispatcher(client).start()
+    d.send("r1", "one")
+    d.send("r1", "two")
+    assert d.join(timeout=5)
+    d.shutdown()
+    assert client.sent == [("r1", "two")]
+    assert d.stats["failed"] == 1
+
+
+def test_pending_fact_replies_for_a_room_are_coalesced_in_order():
+    client = FlakyClient([])
+    d = ReplyDispatcher(client, coalesce=True, max_coalesce=3)
+    for n in range(5):
+        d.send("r1", f"fact {n}", coalescible=True)
+    d.send("r2", "other", coalescible=True)
+    d.start()
+    assert d.join(timeout=5)
+    d.shutdown()
+
+    r1 = [m for room, m in client.sent if room == "r1"]
+    assert r1 == [
+        COALESCE_SEPARATOR.join(["fact 0", "fact 1", "fact 2"]),
+        COALESCE_SEPARATOR.join(["fact 3", "fact 4"]),
+    ]
+    assert d.stats["replies_sent"] == 6
+
+
+def test_sustained_sends_run_at_the_limit_without_losing_replies():
+    stub = StubWebex().start()
+    stub.post_limit_per_second = 100
+    stub.retry_after = 0.2
+    try:
+        client = WebexClient("token", api_base=stub.api_base)
+        d = ReplyDispatcher(
+            client, room_rate=100, room_burst=10, token_rate=100, token_burst=10, workers=8
+        ).start()
+        total = 250
+        start = time.monotonic()
+        for n in range(total):
+            d.send(f"room-{n % 10}", f"reply {n}")
+        assert d.join(timeout=20)
+        elapsed = time.monotonic() - start
+        d.shutdown()
+    finally:
+        stub.stop()
+
+    assert sorted(p["markdown"] for p in stub.sent) == sorted(f"reply {n}" for n in range(total))
+    # (total - burst) / rate = 2.4s at the limit; allow slack for slow machines
+    assert 2.2 < elapsed < 6
+    for room in range(10):
+        replies = [p["markdown"] for p in stub.sent if p["roomId"] == f"room-{room}"]
+        assert replies == [f"reply {n}" for n in range(room, total, 10)]
+
+
+def test_idle_room_buckets_are_pruned():
+    client = FlakyClient([])
+    d = ReplyDispatcher(client, room_rate=1000, room_burst=1).start()
+    d.send("r1", "one")
+    assert d.join(timeout=5)
+    time.sleep(0.01)  # r1's bucket refills
+
+    d._next_prune = 0  # do not wait out the prune interval
+    d.send("r2", "two")
+    assert d.join(timeout=5)
+    d.shutdown()
+    assert "r1" not in d._room_buckets
+    assert client.sent == [("r1", "one"), ("r2", "two")]
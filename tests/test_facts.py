@@ -0,0 +1,108 @@
+import json
+import time
+
+from facts import FACT_UNAVAILABLE_MARKDOWN, FactBuffer
+
+
+class FakeFactApi:
+    def __init__(self, facts):
+        self.facts = list(facts)
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        return self
+
+    # Acts as its own response object
+    status_code = 200
+    text = ""
+
+    def json(self):
+        if not self.facts:
+            raise ValueError("out of facts")
+        return self.facts.pop(0)
+
+
+def _fact(n):
+    return {"id": f"f{n}", "text": f"fact {n}", "source": "test"}
+
+
+def test_take_serves_prefetched_facts_without_upstream_calls():
+    api = FakeFactApi([_fact(i) for i in range(3)])
+    buf = FactBuffer(http=api, capacity=3)
+    assert buf.refill_once() == 3
+    calls = api.calls
+    assert [buf.take("r1")["id"] for _ in range(3)] == ["f0", "f1", "f2"]
+    assert api.calls == calls
+
+
+def test_room_does_not_see_repeats_but_other_rooms_can():
+    buf = FactBuffer(http=FakeFactApi([]), capacity=5)
+    buf.add(_fact(1))
+    assert buf.take("r1")["id"] == "f1"
+    buf.add(_fact(1))
+    buf.add(_fact(2))
+    assert buf.take("r1")["id"] == "f2"
+    assert buf.take("r2")["id"] == "f1"
+
+
+def test_expired_facts_are_dropped():
+    buf = FactBuffer(http=FakeFactApi([]), capacity=5, ttl=-1)
+    buf.add(_fact(1))
+    buf._corpus.clear()
+    assert buf.take("r1") is None
+    assert buf.reply_markdown("r1") == FACT_UNAVAILABLE_MARKDOWN
+
+
+def test_corpus_survives_restart_and_covers_outages(tmp_path):
+    path = str(tmp_path / "corpus.jsonl")
+    FactBuffer(http=FakeFactApi([_fact(1), _fact(2)]), capacity=2, corpus_path=path).refill_once()
+    assert [json.loads(l)["id"] for l in open(path)] == ["f1", "f2"]
+
+    # Fact API down, nothing buffered: answer from disk
+    offline = FactBuffer(http=FakeFactApi([]), corpus_path=path)
+    assert offline.take("r1")["id"] == "f2"
+    assert offline.take("r1")["id"] == "f1"
+
+
+def test_exhausted_corpus_repeats_oldest_fact_during_outage(tmp_path):
+    path = str(tmp_path / "corpus.jsonl")
+    FactBuffer(http=FakeFactApi([_fact(i) for i in range(3)]), capacity=3, corpus_path=path).refill_once()
+
+    offline = FactBuffer(http=FakeFactApi([]), corpus_path=path)
+    served = [offline.take("r1")["id"] for _ in range(6)]
+    assert served == ["f2", "f1", "f0", "f2", "f1", "f0"]
+    assert offline.reply_markdown("r1") != FACT_UNAVAILABLE_MARKDOWN
+
+
+class DeadFactApi:
+    """Answers 503 after `delay` seconds, like a fact API that is timing out."""
+
+    status_code = 503
+    text = "down"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self
+
+
+def test_outage_replies_do_not_wait_on_the_fact_api(tmp_path):
+    path = str(tmp_path / "corpus.jsonl")
+    FactBuffer(http=FakeFactApi([_fact(1), _fact(2)]), capacity=2, corpus_path=path).refill_once()
+
+    api = DeadFactApi()
+    offline = FactBuffer(http=api, corpus_path=path)
+    assert offline.refill_once() == 0  # the background refill notices the outage
+    api.delay = 5
+    calls = api.calls
+
+    started = time.monotonic()
+    served = [offline.take("r1")["id"] for _ in range(4)]
+    assert time.monotonic() - started < 1
+    assert served == ["f2", "f1", "f2", "f1"]
+    assert api.calls == calls
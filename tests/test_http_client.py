@@ -0,0 +1,29 @@
+from http_client import HostProfile, HttpClients
+from bench.stub_servers import StubWebex
+from webex_client import WebexClient
+
+
+def test_requests_to_one_host_reuse_a_pooled_connection():
+    stub = StubWebex().start()
+    try:
+        stub.add_message("/fact")
+        http = HttpClients()
+        client = WebexClient("token", api_base=stub.api_base, http=http)
+        for _ in range(10):
+            client.list_messages("room-1")
+        client.post_message("room-1", "hello")
+
+        (counts,) = http.stats().values()
+        assert counts["requests"] == 11
+        assert counts["new_connections"] == 1
+        assert counts["reused_connections"] == 10
+        http.close()
+    finally:
+        stub.stop()
+
+
+def test_profiles_are_picked_per_host():
+    fast = HostProfile(connect_timeout=1, read_timeout=2)
+    http = HttpClients(profiles={"facts.example": fast})
+    assert http.profile_for("facts.example").timeout == (1, 2)
+    assert http.profile_for("other.example") is http.default_profile
@@ -0,0 +1,91 @@
+import time
+
+from prometheus_client import REGISTRY
+
+import app as app_module
+from app import app
+from bot import handle_message
+from facts import FactBuffer
+from http_client import HttpClients
+from metrics import RENDER_SECONDS, UPSTREAM_RESPONSES
+from bench.stub_servers import StubWebex
+from webex_client import WebexClient
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_expose_stage_latencies_and_queue_depths():
+    r = app.test_client().get("/metrics")
+    for name in (
+        b"webexbot_poll_seconds",
+        b"webexbot_fact_fetch_seconds",
+        b"webexbot_render_seconds",
+        b"webexbot_send_seconds",
+        b'webexbot_queue_depth{queue="commands"}',
+        b"webexbot_upstream_responses_total",
+    ):
+        assert name in r.data
+
+
+def test_upstream_status_classes_are_counted_per_host():
+    stub = StubWebex().start()
+    try:
+        http = HttpClients()
+        client = WebexClient("token", api_base=stub.api_base, http=http)
+        before_ok = _sample("webexbot_upstream_responses_total", upstream="127.0.0.1", status_class="2xx")
+        before_429 = _sample("webexbot_upstream_responses_total", upstream="127.0.0.1", status_class="4xx")
+        client.list_messages("room-1")
+        stub.throttle_next = 1
+        try:
+            client.list_messages("room-1")
+        except Exception:
+            pass
+        assert _sample("webexbot_upstream_responses_total", upstream="127.0.0.1", status_class="2xx") == before_ok + 1
+        assert _sample("webexbot_upstream_responses_total", upstream="127.0.0.1", status_class="4xx") == before_429 + 1
+        assert http.upstream_status()["127.0.0.1"]["reachable"] is True
+    finally:
+        stub.stop()
+
+
+def test_slow_fact_fetches_do_not_count_as_render_time():
+    class SlowFactApi:
+        status_code = 200
+
+        def get(self, url):
+            time.sleep(0.3)
+            return self
+
+        def json(self):
+            return {"id": "slow", "text": "a slow fact"}
+
+    class Client:
+        def post_message(self, room_id, markdown):
+            pass
+
+    fetch_before = _sample("webexbot_fact_fetch_seconds_sum")
+    render_before = _sample("webexbot_render_seconds_sum")
+    handle_message(Client(), {"roomId": "r1", "text": "/fact"}, facts=FactBuffer(http=SlowFactApi()))
+    assert _sample("webexbot_fact_fetch_seconds_sum") - fetch_before >= 0.3
+    assert _sample("webexbot_render_seconds_sum") - render_before < 0.1
+
+
+def test_health_reports_a_dead_loop(monkeypatch):
+    monkeypatch.setattr(app_module, "_started", True)
+    r = app.test_client().get("/health")
+    assert r.status_code == 503
+    assert r.json["ok"] is False and r.json["loop_alive"] is False
+
+
+def test_instrumentation_overhead_is_negligible():
+    n = 20000
+    labels = UPSTREAM_RESPONSES.labels(upstream="overhead-test", status_class="2xx")
+    start = time.perf_counter()
+    for _ in range(n):
+        with RENDER_SECONDS.time():
+            pass
+        labels.inc()
+    per_call = (time.perf_counter() - start) / n
+    # A histogram timing plus a counter bump per reply; replies take milliseconds
+    assert per_call < 50e-6
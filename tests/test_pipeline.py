@@ -0,0 +1,69 @@
+import threading
+import time
+
+from commands import CommandContext, router
+from pipeline import Pipeline
+
+
+class FakeFacts:
+    def __init__(self):
+        self.n = 0
+
+    def reply_markdown(self, room_id):
+        self.n += 1
+        return f"fact {self.n}"
+
+
+def test_router_handles_fact_and_facts_n():
+    ctx = CommandContext("r1", {}, facts=FakeFacts())
+    assert router.dispatch(ctx, "/fact") == "fact 1"
+    assert router.dispatch(ctx, "/FACTS 3").count("fact ") == 3
+    assert router.dispatch(ctx, "/facts 999").count("fact ") == 5
+    assert router.dispatch(ctx, "/factoid") is None
+    assert router.dispatch(ctx, "hello /fact") is None
+
+
+def test_replies_within_a_room_keep_their_order():
+    seen = []
+    lock = threading.Lock()
+
+    def handler(item):
+        room, n = item
+        time.sleep(0.001 * ((n * 7) % 5))
+        with lock:
+            seen.append(item)
+
+    p = Pipeline(handler, workers=8).start()
+    for n in range(50):
+        for room in ("a", "b", "c"):
+            p.submit(room, (room, n))
+    p.shutdown(drain=True, timeout=10)
+
+    assert len(seen) == 150
+    for room in ("a", "b", "c"):
+        assert [n for r, n in seen if r == room] == list(range(50))
+
+
+def test_submit_applies_backpressure_when_full():
+    release = threading.Event()
+    p = Pipeline(lambda item: release.wait(5), workers=1, max_pending=2).start()
+    assert p.submit("a", 1, block=False)
+    assert p.submit("b", 2, block=False)
+    assert not p.submit("c", 3, block=False)
+    assert not p.submit("c", 3, timeout=0.05)
+    release.set()
+    assert p.submit("c", 3, timeout=5)
+    p.shutdown(drain=True, timeout=5)
+    assert p.qsize() == 0
+
+
+def test_throughput_scales_with_workers():
+    def run(workers):
+        p = Pipeline(lambda item: time.sleep(0.01), workers=workers).start()
+        start = time.monotonic()
+        for n in range(80):
+            p.submit(f"room-{n % 16}", n)
+        p.shutdown(drain=True, timeout=30)
+        return time.monotonic() - start
+
+    assert run(8) < run(1) / 3
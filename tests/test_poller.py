@@ -0,0 +1,103 @@
+import threading
+import time
+
+from poller import AdaptiveInterval, RoomPoller
+from bench.stub_servers import StubWebex
+from webex_client import WebexClient
+
+
+def _poller(stub, handled, **kwargs):
+    client = WebexClient("token", api_base=stub.api_base)
+    interval = AdaptiveInterval(minimum=0.01, maximum=0.2)
+    return RoomPoller(client, "room-1", handled.append, interval=interval, **kwargs)
+
+
+def test_adaptive_interval_backs_off_and_recovers():
+    interval = AdaptiveInterval(minimum=1, maximum=10, factor=2)
+    interval.on_idle()
+    interval.on_idle()
+    assert interval.current == 4
+    interval.on_throttle(retry_after=30)
+    assert interval.current == 30
+    interval.on_activity()
+    assert interval.current == 1
+
+
+def test_poller_handles_every_message_in_a_burst_oldest_first():
+    stub = StubWebex().start()
+    try:
+        stub.add_message("history")
+        handled = []
+        poller = _poller(stub, handled, page_size=10)
+        poller.poll_once()  # primes the cursor, does not replay history
+
+        for i in range(35):
+            stub.add_message(f"/fact {i}")
+        assert poller.poll_once() == 35
+        assert [m["text"] for m in handled] == [f"/fact {i}" for i in range(35)]
+        assert poller.poll_once() == 0
+    finally:
+        stub.stop()
+
+
+def test_poller_catches_up_on_a_backlog_of_many_pages():
+    stub = StubWebex().start()
+    try:
+        handled = []
+        pages = []
+        poller = _poller(stub, handled, page_size=5, on_page=lambda: pages.append(1))
+        poller.poll_once()
+
+        # Far more than the ten pages a single poll used to stop at
+        for i in range(123):
+            stub.add_message(f"/fact {i}")
+        assert poller.poll_once() == 123
+        assert [m["text"] for m in handled] == [f"/fact {i}" for i in range(123)]
+        assert len(pages) == poller.last_calls - 1 == 24
+    finally:
+        stub.stop()
+
+
+def test_poller_honours_retry_after_without_losing_messages():
+    stub = StubWebex().start()
+    try:
+        handled = []
+        poller = _poller(stub, handled)
+        poller.poll_once()
+        stub.add_message("/fact")
+        stub.throttle_next = 1
+        stub.retry_after = 5
+        assert poller.poll_once() == 0
+        assert poller.interval.current == 5
+        assert poller.poll_once() == 1
+        assert poller.interval.current == 0.01
+        assert [m["text"] for m in handled] == ["/fact"]
+    finally:
+        stub.stop()
+
+
+def test_poller_misses_no_commands_under_sustained_load():
+    stub = StubWebex().start()
+    stop_event = threading.Event()
+    try:
+        handled = []
+        poller = _poller(stub, handled, page_size=20)
+        poller.poll_once()
+        t = threading.Thread(target=poller.run, args=(stop_event,), daemon=True)
+        t.start()
+
+        # 300 commands in well under a second, far above hundreds per minute
+        total = 300
+        for i in range(total):
+            stub.add_message(f"/fact {i}")
+            if i % 50 == 0:
+                time.sleep(0.05)
+
+        deadline = time.monotonic() + 5
+        while len(handled) < total and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop_event.set()
+        stub.stop()
+
+    assert [m["text"] for m in handled] == [f"/fact {i}" for i in range(total)]
@@ -0,0 +1,130 @@
+import threading
+import time
+
+from dispatcher import ReplyDispatcher
+from scheduler import RoomScheduler, calls_per_minute_bucket, read_room_ids, watch_rooms_file
+from webex_client import WebexApiError
+
+
+class FakeWebex:
+    """In-memory rooms; only a few of them ever see new messages."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rooms = {}
+        self.n = 0
+
+    def post(self, room_id, text):
+        with self.lock:
+            self.n += 1
+            self.rooms.setdefault(room_id, []).insert(
+                0, {"id": f"m{self.n}", "roomId": room_id, "text": text, "created": f"{self.n:08d}"}
+            )
+
+    def list_messages(self, room_id, max_items=1, before_message=None):
+        with self.lock:
+            items = list(self.rooms.get(room_id, []))
+        if before_message:
+            ids = [m["id"] for m in items]
+            items = items[ids.index(before_message) + 1:]
+        return items[:max_items]
+
+
+def _run(scheduler, seconds, during=None):
+    stop = threading.Event()
+    t = threading.Thread(target=scheduler.run, args=(stop,), daemon=True)
+    t.start()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if during:
+            during()
+        time.sleep(0.02)
+    stop.set()
+    t.join(5)
+
+
+def test_calls_scale_with_active_rooms_not_total_rooms():
+    webex = FakeWebex()
+    handled = []
+    rooms = [f"room-{i}" for i in range(200)]
+    scheduler = RoomScheduler(
+        webex, handled.append, room_ids=rooms, budget_per_minute=60000,
+        min_interval=0.02, max_interval=1.0,
+    )
+    _run(scheduler, 1.5, during=lambda: [webex.post(r, "/fact") for r in ("room-0", "room-1")])
+
+    hot = scheduler.calls_by_room["room-0"] + scheduler.calls_by_room["room-1"]
+    idle = sum(scheduler.calls_by_room[r] for r in rooms[2:]) / len(rooms[2:])
+    assert hot / 2 > 5 * idle
+    assert {m["roomId"] for m in handled} == {"room-0", "room-1"}
+
+
+def test_shared_budget_caps_calls_across_rooms():
+    webex = FakeWebex()
+    scheduler = RoomScheduler(
+        webex, lambda m: None, room_ids=[f"room-{i}" for i in range(50)],
+        budget_per_minute=600, min_interval=0.01, max_interval=0.01,
+    )
+    _run(scheduler, 1.0)
+    # A 100-call burst plus ~10 calls per second
+    assert sum(scheduler.calls_by_room.values()) <= 115
+
+
+def test_rooms_can_be_added_and_removed_while_running():
+    webex = FakeWebex()
+    handled = []
+    scheduler = RoomScheduler(
+        webex, handled.append, room_ids=["a"], budget_per_minute=60000,
+        min_interval=0.01, max_interval=0.05,
+    )
+    stop = threading.Event()
+    t = threading.Thread(target=scheduler.run, args=(stop,), daemon=True)
+    t.start()
+    try:
+        scheduler.sync_rooms(["b"])
+        time.sleep(0.2)
+        webex.post("a", "/fact")
+        webex.post("b", "/fact")
+        time.sleep(0.3)
+    finally:
+        stop.set()
+        t.join(5)
+    assert scheduler.room_ids == ["b"]
+    assert [m["roomId"] for m in handled] == ["b"]
+
+
+def test_read_room_ids_skips_comments_and_duplicates(tmp_path):
+    path = tmp_path / "rooms.txt"
+    path.write_text("a\n# b\n\nc  # main room\na\n")
+    assert read_room_ids(str(path)) == ["a", "c"]
+
+
+def test_rooms_file_keeps_rooms_from_the_environment(tmp_path):
+    path = tmp_path / "rooms.txt"
+    path.write_text("b\nc\n")
+    scheduler = RoomScheduler(FakeWebex(), lambda m: None, room_ids=["a"])
+    stop = threading.Event()
+    stop.set()  # read the file once and return
+    watch_rooms_file(scheduler, str(path), stop, static_room_ids=["a"])
+    assert scheduler.room_ids == ["a", "b", "c"]
+
+
+def test_polls_and_replies_share_one_budget_and_pause():
+    class ThrottledClient:
+        def post_message(self, room_id, markdown):
+            raise WebexApiError(429, "slow down", retry_after=5)
+
+    budget = calls_per_minute_bucket(6000)
+    scheduler = RoomScheduler(FakeWebex(), lambda m: None, room_ids=["a"], budget=budget)
+    dispatcher = ReplyDispatcher(ThrottledClient(), budget=budget).start()
+    assert scheduler.budget is dispatcher.token_bucket
+
+    dispatcher.send("r1", "a fact")
+    deadline = time.monotonic() + 5
+    while not dispatcher.stats["throttled"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.shutdown(drain=False, timeout=1)
+
+    # The 429 on a reply holds polls back too
+    assert budget.wait_time() > 4
+    assert not budget.try_acquire()
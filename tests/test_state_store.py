@@ -0,0 +1,124 @@
+from bot import lookup_room_title, process_message
+from dispatcher import ReplyDispatcher
+from poller import AdaptiveInterval, RoomPoller
+from state_store import StateStore
+from bench.stub_servers import StubWebex
+from webex_client import WebexClient
+
+
+class RecordingClient:
+    def __init__(self):
+        self.sent = []
+        self.room_lookups = 0
+
+    def post_message(self, room_id, markdown):
+        self.sent.append((room_id, markdown))
+
+    def get_room_title(self, room_id):
+        self.room_lookups += 1
+        return "Daily Updates"
+
+
+class FakeFacts:
+    def reply_markdown(self, room_id):
+        return "a fact"
+
+
+def test_cursor_never_moves_backwards(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.set_cursor("r1", "m2", "2024-01-01T00:00:02.000Z")
+    store.set_cursor("r1", "m1", "2024-01-01T00:00:01.000Z")
+    assert store.get_cursor("r1") == {"id": "m2", "created": "2024-01-01T00:00:02.000Z"}
+
+
+def test_processed_ids_are_bounded(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"), processed_limit=10)
+    for n in range(50):
+        assert store.mark_processed(f"m{n}", "r1")
+    assert not store.mark_processed("m49", "r1")
+    assert store.is_processed("m49")
+    assert not store.is_processed("m0")
+
+
+def test_messages_are_answered_once_across_restarts(tmp_path):
+    path = str(tmp_path / "state.db")
+    client = RecordingClient()
+    message = {"id": "m1", "roomId": "r1", "text": "/fact", "created": "t1"}
+    assert process_message(client, message, store=StateStore(path), facts=FakeFacts())
+    assert not process_message(client, message, store=StateStore(path), facts=FakeFacts())
+    assert client.sent == [("r1", "a fact")]
+
+
+def test_queued_replies_count_as_handled_only_once_delivered(tmp_path):
+    path = str(tmp_path / "state.db")
+    client = RecordingClient()
+    command = {"id": "m1", "roomId": "r1", "text": "/fact", "created": "t1"}
+    chatter = {"id": "m2", "roomId": "r1", "text": "hello", "created": "t2"}
+
+    # Crash with the reply still queued: nothing is recorded
+    store = StateStore(path)
+    lost = ReplyDispatcher(client)
+    assert process_message(client, command, store=store, facts=FakeFacts(), dispatcher=lost)
+    process_message(client, chatter, store=store, facts=FakeFacts(), dispatcher=lost)
+    assert not store.is_processed("m1")
+    assert store.get_cursor("r1") is None
+    assert client.sent == []
+
+    # After the restart the command is answered, then recorded
+    store = StateStore(path)
+    dispatcher = ReplyDispatcher(client).start()
+    assert process_message(client, command, store=store, facts=FakeFacts(), dispatcher=dispatcher)
+    assert dispatcher.join(timeout=5)
+    dispatcher.shutdown()
+    assert client.sent == [("r1", "a fact")]
+    assert store.is_processed("m1")
+    assert store.get_cursor("r1") == {"id": "m1", "created": "t1"}
+
+
+def test_restart_catches_up_on_commands_sent_while_down(tmp_path):
+    path = str(tmp_path / "state.db")
+    stub = StubWebex().start()
+    try:
+        webex = WebexClient("token", api_base=stub.api_base)
+        client = RecordingClient()
+        stub.add_message("/fact before")
+
+        def run_bot(store):
+            handled = []
+            poller = RoomPoller(
+                webex,
+                "room-1",
+                lambda m: handled.append(m) or process_message(client, m, store=store, facts=FakeFacts()),
+                interval=AdaptiveInterval(0.01, 0.01),
+                cursor=store.get_cursor("room-1"),
+                on_prime=store.set_cursor,
+            )
+            poller.poll_once()
+            poller.poll_once()
+            return handled
+
+        store = StateStore(path)
+        run_bot(store)  # first start: primes at the newest message
+        stub.add_message("/fact 1")
+        assert [m["text"] for m in run_bot(store)] == ["/fact 1"]
+        store.close()
+
+        # Down for a while
+        for n in range(2, 7):
+            stub.add_message(f"/fact {n}")
+
+        store = StateStore(path)
+        assert [m["text"] for m in run_bot(store)] == [f"/fact {n}" for n in range(2, 7)]
+        assert len(client.sent) == 6
+    finally:
+        stub.stop()
+
+
+def test_room_title_comes_from_cache_when_fresh(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    client = RecordingClient()
+    assert lookup_room_title(client, "r1", store=store) == "Daily Updates"
+    assert lookup_room_title(client, "r1", store=store) == "Daily Updates"
+    assert client.room_lookups == 1
+    assert lookup_room_title(client, "r1", store=store, max_age=-1) == "Daily Updates"
+    assert client.room_lookups == 2
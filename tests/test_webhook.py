@@ -0,0 +1,79 @@
+import hashlib
+import hmac
+import json
+
+import app as app_module
+from app import app
+
+
+def _signed(body, secret):
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha1).hexdigest()
+
+
+def test_webhook_rejects_bad_signature(monkeypatch):
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(app_module, "start_background", lambda: None)
+    c = app.test_client()
+    body = json.dumps({"resource": "messages", "event": "created", "data": {"id": "m1", "roomId": "r1"}})
+    r = c.post("/webhook", data=body, headers={"X-Spark-Signature": "deadbeef"},
+               content_type="application/json")
+    assert r.status_code == 403
+    assert app_module.pipeline.qsize() == 0
+
+
+def test_webhook_rejects_unsigned_event_without_secret(monkeypatch):
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_SECRET", "")
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_ALLOW_UNSIGNED", False)
+    monkeypatch.setattr(app_module, "start_background", lambda: None)
+    c = app.test_client()
+    body = json.dumps({"resource": "messages", "event": "created", "data": {"id": "m1", "roomId": "r1"}})
+    r = c.post("/webhook", data=body, content_type="application/json")
+    assert r.status_code == 403
+    assert app_module.pipeline.qsize() == 0
+
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_ALLOW_UNSIGNED", True)
+    r = c.post("/webhook", data=body, content_type="application/json")
+    app_module.pipeline.clear()
+    assert r.status_code == 202
+
+
+def test_webhook_enqueues_signed_event(monkeypatch):
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(app_module, "start_background", lambda: None)
+    c = app.test_client()
+    body = json.dumps({"resource": "messages", "event": "created", "data": {"id": "m1", "roomId": "r1"}}).encode()
+    r = c.post("/webhook", data=body, headers={"X-Spark-Signature": _signed(body, "s3cret")},
+               content_type="application/json")
+    dropped = app_module.pipeline.clear()
+    assert r.status_code == 202
+    assert [e["data"]["id"] for e in dropped] == ["m1"]
+
+
+def test_webhook_rejects_malformed_body(monkeypatch):
+    monkeypatch.setattr(app_module, "WEBEX_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(app_module, "start_background", lambda: None)
+    c = app.test_client()
+    for event in ([1, 2], {"resource": "messages", "event": "created", "data": "x"}):
+        body = json.dumps(event).encode()
+        r = c.post("/webhook", data=body, headers={"X-Spark-Signature": _signed(body, "s3cret")},
+                   content_type="application/json")
+        assert r.status_code == 400
+    assert app_module.pipeline.qsize() == 0
+
+
+def test_process_event_fetches_message_and_replies(monkeypatch):
+    sent = []
+
+    class FakeClient:
+        def get_message(self, message_id):
+            return {"id": message_id, "roomId": "r1", "text": "/fact"}
+
+        def post_message(self, room_id, markdown):
+            sent.append((room_id, markdown))
+
+    monkeypatch.setattr(app_module, "get_client", lambda: FakeClient())
+    monkeypatch.setattr(app_module, "get_dispatcher", lambda: None)
+    monkeypatch.setattr(app_module, "get_state_store", lambda: None)
+    monkeypatch.setattr(app_module.fact_buffer, "reply_markdown", lambda room_id: "a fact")
+    app_module.process_event({"data": {"id": "m1", "roomId": "r1"}})
+    assert sent == [("r1", "a fact")]
@@ -0,0 +1,102 @@
+######################################################################################
+# Webex REST client
+#
+# Thin wrapper around the handful of Webex endpoints the bot needs:
+# - GET  /messages/{id}   (webhook events only carry the message ID)
+# - GET  /messages        (polling fallback)
+# - POST /messages        (replies)
+# - GET  /rooms/{id}      (room title lookup for nicer logging)
+######################################################################################
+
+import json
+
+from http_client import default_clients
+from metrics import SEND_SECONDS
+
+######################################################################################
+# Constants
+######################################################################################
+
+WEBEX_API_BASE = "https://webexapis.com/v1"
+
+
+class WebexApiError(Exception):
+    """Raised when Webex answers with anything other than 200 OK."""
+
+    def __init__(self, status_code, text, retry_after=None):
+        super().__init__(f"Webex API returned {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+        self.retry_after = retry_after
+
+
+def _retry_after_seconds(resp):
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class WebexClient:
+    def __init__(self, access_token, api_base=WEBEX_API_BASE, http=None):
+        if not access_token.lower().startswith("bearer "):
+            access_token = "Bearer " + access_token
+        self.access_token = access_token
+        self.api_base = api_base.rstrip("/")
+        # Timeouts, retries and pooling come from the per-host profile
+        self.http = http or default_clients()
+
+    def _headers(self, json_body=False):
+        headers = {"Authorization": self.access_token}
+        if json_body:
+            headers["Content-Type"] = "application/json"
+        return headers
+
+    def _check(self, resp):
+        if resp.status_code != 200:
+            raise WebexApiError(
+                resp.status_code, resp.text, retry_after=_retry_after_seconds(resp)
+            )
+        return resp.json()
+
+    def get_message(self, message_id):
+        resp = self.http.get(
+            f"{self.api_base}/messages/{message_id}",
+            headers=self._headers(),
+        )
+        return self._check(resp)
+
+    def list_messages(self, room_id, max_items=1, before_message=None):
+        """List messages in a room, newest first."""
+        params = {"roomId": room_id, "max": max_items}
+        if before_message:
+            params["beforeMessage"] = before_message
+        resp = self.http.get(
+            f"{self.api_base}/messages",
+            params=params,
+            headers=self._headers(),
+        )
+        return self._check(resp).get("items", [])
+
+    def post_message(self, room_id, markdown):
+        with SEND_SECONDS.time():
+            resp = self.http.post(
+                f"{self.api_base}/messages",
+                headers=self._headers(json_body=True),
+                data=json.dumps({"roomId": room_id, "markdown": markdown}),
+            )
+        return self._check(resp)
+
+    def get_room(self, room_id):
+        resp = self.http.get(
+            f"{self.api_base}/rooms/{room_id}",
+            headers=self._headers(),
+        )
+        return self._check(resp)
+
+    def get_room_title(self, room_id, default="(Unknown Title)"):
+        # One room by ID rather than listing every room the token can see
+        return self.get_room(room_id).get("title", default)